@@ -6,11 +6,17 @@ from datetime import datetime, date
 
 from robo_fmabc import executar_robo_fmabc
 from extrator import executar_extrator_tabelado
-from escrivao import enviar_para_google_sheets
+from escrivao import enviar_para_google_sheets, enviar_para_varias_planilhas, invalidar_cache_sheets
+from fila_envio import enfileirar_envio, iniciar_trabalhador, status_fila
+from armazem import ARMAZEM
+from janela import HORA_CORTE_PADRAO
 
 st.set_page_config(page_title="tablab", layout="wide")
 st.title("🧪 tablab abc")
 
+# Retoma envios que ficaram na fila (por exemplo, após reinício do serviço)
+iniciar_trabalhador()
+
 # Menu lateral
 aba = st.sidebar.radio("Escolha a funcionalidade:", [
     "⬇️ Download de exames",
@@ -27,8 +33,10 @@ elif aba == "📊 Extrair exames dos PDFs":
     executar_extrator_tabelado()
 
 elif aba == "📤 Enviar exames para o Censo":
-    if "df_exames" in st.session_state:
-        url = st.text_input("📎 Cole aqui o link da planilha do Google Sheets:")
+    # Exames já extraídos ficam no armazém local e sobrevivem a reinícios do app
+    if "df_exames" in st.session_state or ARMAZEM.dias_disponiveis():
+        links = st.text_area("📎 Cole aqui o link da planilha do Google Sheets (várias enfermarias: um link por linha):")
+        urls = [u.strip() for u in links.splitlines() if u.strip()]
 
         hoje = date.today()
         if "data_ref" not in st.session_state:
@@ -36,20 +44,69 @@ elif aba == "📤 Enviar exames para o Censo":
 
         data_ref = st.date_input("📆 Escolha a data de referência para o envio:", value=st.session_state["data_ref"])
         st.session_state["data_ref"] = data_ref
+        hora_corte = st.time_input(
+            "🕦 Incluir exames da véspera a partir de:",
+            value=datetime.strptime(HORA_CORTE_PADRAO, "%H:%M:%S").time(),
+        )
+
+        # Planilha e lista de abas ficam em cache por alguns minutos; o censo é relido a cada envio
+        if st.button("🔄 Recarregar abas da planilha"):
+            invalidar_cache_sheets()
+            st.info("Planilha e abas serão relidas no próximo envio.")
+
+        em_segundo_plano = st.checkbox(
+            "📨 Enviar em segundo plano (o envio continua mesmo se a página for fechada)"
+        )
 
         if st.button("📤 Enviar dados ao Censo"):
             progresso = st.progress(0)
-            with st.spinner("⏳ Enviando dados para o Censo..."):
-                sucesso = enviar_para_google_sheets(
-                    st.session_state["df_exames"],
-                    url,
-                    data_referencia=data_ref,
-                    barra_progresso=progresso
-                )
-            if sucesso:
-                st.success("✅ Dados enviados com sucesso!")
+            # O que acabou de ser extraído vale; o armazém (None) só quando não há extração na sessão
+            df_envio = st.session_state.get("df_exames")
+            if df_envio is not None and df_envio.empty:
+                df_envio = None
+            if em_segundo_plano:
+                total = enfileirar_envio(df_envio, urls, data_referencia=data_ref, hora_corte=hora_corte)
+                progresso.progress(1.0)
+                st.success(f"📨 {total} linhas colocadas na fila de envio.")
+            elif len(urls) > 1:
+                with st.spinner(f"⏳ Enviando dados para {len(urls)} planilhas..."):
+                    resultados = enviar_para_varias_planilhas(
+                        df_envio,
+                        urls,
+                        data_referencia=data_ref,
+                        barra_progresso=progresso,
+                        hora_corte=hora_corte,
+                    )
+                for url_planilha, sucesso in resultados.items():
+                    if sucesso:
+                        st.success(f"✅ {url_planilha}")
+                    else:
+                        st.error(f"❌ Falha ao enviar para {url_planilha}")
             else:
-                st.error("❌ Falha ao enviar os dados. Verifique o link e tente novamente.")
+                with st.spinner("⏳ Enviando dados para o Censo..."):
+                    sucesso = enviar_para_google_sheets(
+                        df_envio,
+                        urls[0] if urls else "",
+                        data_referencia=data_ref,
+                        barra_progresso=progresso,
+                        hora_corte=hora_corte,
+                    )
+                if sucesso:
+                    st.success("✅ Dados enviados com sucesso!")
+                else:
+                    st.error("❌ Falha ao enviar os dados. Verifique o link e tente novamente.")
+
+        situacao = status_fila()
+        if any(situacao[estado] for estado in ("pendente", "em_envio", "falhou")):
+            st.markdown("#### 📨 Fila de envio")
+            colunas = st.columns(4)
+            colunas[0].metric("Pendentes", situacao["pendente"])
+            colunas[1].metric("Enviando", situacao["em_envio"])
+            colunas[2].metric("Enviadas", situacao["enviado"])
+            colunas[3].metric("Falharam", situacao["falhou"])
+            if situacao["ultimo_erro"]:
+                st.caption(f"Último erro: {situacao['ultimo_erro']}")
+            st.button("🔄 Atualizar")
     else:
         st.warning("Nenhum exame extraído ainda. Por favor, realize a extração primeiro.")
 
@@ -97,7 +154,6 @@ elif aba == "🐯 Tudo de uma vez":
                 st.error("❌ Nenhum exame foi extraído dos PDFs.")
                 st.stop()
 
-            st.session_state["df_exames"] = df_exames
             progresso.progress(0.66)
 
             # 3. Enviar ao Google Sheets apenas a data escolhida
@@ -0,0 +1,112 @@
+# armazem.py - Armazenamento local dos exames extraídos, em Parquet particionado pela data da amostra
+
+import os
+import threading
+import uuid
+from datetime import timedelta
+
+import pandas as pd
+
+from cache_extracao import DIRETORIO_DADOS
+from janela import HORA_CORTE_PADRAO, IndiceTemporal
+
+DIRETORIO_RESULTADOS = os.path.join(DIRETORIO_DADOS, "resultados")
+
+
+class ArmazemExames:
+    """
+    Guarda os exames em <diretorio>/data=AAAA-MM-DD/exames.parquet, uma
+    partição por dia da amostra. Cada partição é regravada inteira a cada
+    anexação, com uma linha por paciente e data/hora de amostra, então
+    reprocessar uma pasta não duplica linhas. Na mesma linha, os valores da
+    extração nova substituem os guardados (laudo corrigido, extrator
+    consertado); os guardados só preenchem o que a nova deixou vazio.
+    """
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._lock = threading.Lock()
+
+    def _caminho_particao(self, dia):
+        return os.path.join(self.diretorio, f"data={pd.Timestamp(dia):%Y-%m-%d}", "exames.parquet")
+
+    def _ler_particao(self, dia):
+        caminho = self._caminho_particao(dia)
+        if not os.path.exists(caminho):
+            return None
+        return pd.read_parquet(caminho)
+
+    def anexar(self, df):
+        """Anexa os exames às partições dos seus dias; retorna quantas partições foram gravadas"""
+        if df is None or df.empty:
+            return 0
+
+        df = df[df["Data"].notna()]
+        gravadas = 0
+        with self._lock:
+            for dia, grupo in df.groupby(df["Data"].dt.normalize(), observed=True):
+                existente = self._ler_particao(dia)
+                if existente is not None:
+                    # Novas primeiro: colapsar_duplicados fica com o primeiro valor não vazio
+                    grupo = pd.concat([grupo, existente], ignore_index=True)
+                grupo = colapsar_duplicados(_tipar(grupo))
+                grupo = grupo.sort_values(["Data", "Paciente"], ignore_index=True)
+
+                caminho = self._caminho_particao(dia)
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+                grupo.to_parquet(temporario, index=False)
+                os.replace(temporario, caminho)
+                gravadas += 1
+        return gravadas
+
+    def dias_disponiveis(self):
+        if not os.path.isdir(self.diretorio):
+            return []
+        return sorted(
+            pd.Timestamp(nome.split("=", 1)[1]).date()
+            for nome in os.listdir(self.diretorio)
+            if nome.startswith("data=")
+        )
+
+    def ler_dias(self, dias):
+        """Lê só as partições dos dias pedidos"""
+        partes = [p for p in (self._ler_particao(dia) for dia in dias) if p is not None]
+        if not partes:
+            return None
+        return _tipar(pd.concat(partes, ignore_index=True))
+
+    def ler_janela(self, data_referencia, hora_corte=HORA_CORTE_PADRAO):
+        """
+        Exames do dia de referência inteiro mais os da véspera a partir da hora
+        de corte; lê apenas essas duas partições.
+        """
+        data_ref = pd.Timestamp(data_referencia).normalize()
+        df = self.ler_dias([data_ref - timedelta(days=1), data_ref])
+        if df is None:
+            return None
+        return IndiceTemporal(df).janela(data_ref, hora_corte)
+
+
+def colapsar_duplicados(df):
+    """
+    Junta as linhas do mesmo paciente com a mesma data/hora de amostra (o mesmo
+    laudo baixado mais de uma vez, ou partes dele), ficando com o primeiro
+    valor não vazio de cada exame.
+    """
+    if df.empty:
+        return df
+    colunas = list(df.columns)
+    df = df.groupby(["Paciente", "Data"], observed=True, sort=False).first().reset_index()
+    return df[colunas]
+
+
+def _tipar(df):
+    # Partições diferentes têm categorias diferentes; concat devolve object
+    df = df.copy()
+    df["Paciente"] = df["Paciente"].astype("category")
+    df["Data"] = pd.to_datetime(df["Data"])
+    return df
+
+
+ARMAZEM = ArmazemExames(DIRETORIO_RESULTADOS)
@@ -0,0 +1,122 @@
+# benchmark_escrivao.py - Mede o envio ao Censo contra o servidor local de fake_sheets (chamadas, bytes e tempo por tamanho de censo)
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import escrivao
+from escrivao import ABAS_LEITOS, COLUNAS_GOOGLE, definir_cliente_sheets, enviar_para_google_sheets
+from fake_sheets import ServidorSheetsFalso
+from registro_envios import RegistroEnvios
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Iara", "João"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Costa", "Pereira", "Almeida", "Ribeiro", "Conceição"]
+
+
+def gerar_pacientes(quantidade, aleatorio):
+    nomes = set()
+    while len(nomes) < quantidade:
+        nomes.add(" ".join([aleatorio.choice(NOMES), aleatorio.choice(SOBRENOMES), aleatorio.choice(SOBRENOMES)]))
+    return sorted(nomes)
+
+
+def gerar_exames(pacientes, data_referencia, exames_por_paciente, aleatorio):
+    """DataFrame no formato do extrator, com amostras dentro da janela da data de referência"""
+    registros = []
+    inicio = datetime.combine(data_referencia, datetime.min.time())
+    for nome in pacientes:
+        for i in range(exames_por_paciente):
+            registro = {
+                "Paciente": nome,
+                "Data": inicio + timedelta(hours=1 + i * 4, minutes=aleatorio.randint(0, 59)),
+                "Cálcio Total": True,
+            }
+            for col in COLUNAS_GOOGLE[1:]:
+                registro[col] = round(aleatorio.uniform(1, 300), 1)
+            registros.append(registro)
+    return pd.DataFrame(registros)
+
+
+def montar_censo(servidor, pacientes, linhas_existentes):
+    """Planilha com "CENSO AUTOMÁTICO" e as 70 abas de leito; os pacientes ocupam os primeiros leitos"""
+    planilha = servidor.criar_planilha("Censo (benchmark)", ["CENSO AUTOMÁTICO"] + ABAS_LEITOS)
+    planilha.escrever(
+        "'CENSO AUTOMÁTICO'!A19",
+        [[leito, "", "", nome] for leito, nome in zip(ABAS_LEITOS, pacientes)],
+        "RAW",
+    )
+    for leito in ABAS_LEITOS:
+        planilha.escrever(
+            f"'{leito}'!A1",
+            [["Data"] + [""] * 6 + COLUNAS_GOOGLE[1:]] + [["evolução"]] * linhas_existentes,
+            "RAW",
+        )
+    return planilha
+
+
+def medir(leitos, exames_por_paciente=3, latencia=0.05, probabilidade_429=0.0, linhas_existentes=20, semente=0):
+    aleatorio = random.Random(semente)
+    data_referencia = datetime.now().date()
+    pacientes = gerar_pacientes(leitos, aleatorio)
+    df = gerar_exames(pacientes, data_referencia, exames_por_paciente, aleatorio)
+
+    resultados = []
+    with ServidorSheetsFalso(latencia, probabilidade_429, semente) as servidor, \
+            tempfile.TemporaryDirectory() as temporario:
+        planilha = montar_censo(servidor, pacientes, linhas_existentes)
+        definir_cliente_sheets(servidor.cliente())
+
+        # Registro de envios próprio, para não misturar com o de produção
+        registro_original = escrivao.REGISTRO_ENVIOS
+        escrivao.REGISTRO_ENVIOS = RegistroEnvios(os.path.join(temporario, "registro_envios.sqlite"))
+        try:
+            for rodada in ("primeiro envio", "reenvio"):
+                servidor.zerar_estatisticas()
+                relatorio = {}
+                inicio = time.perf_counter()
+                sucesso = enviar_para_google_sheets(df, planilha.url, data_referencia=data_referencia,
+                                                    relatorio=relatorio)
+                duracao = time.perf_counter() - inicio
+                estatisticas = servidor.estatisticas
+                resultados.append({
+                    "leitos": leitos,
+                    "rodada": rodada,
+                    "sucesso": sucesso,
+                    "linhas": relatorio.get("linhas", 0),
+                    "chamadas": sum(estatisticas["chamadas"].values()),
+                    "detalhe": dict(sorted(estatisticas["chamadas"].items())),
+                    "bytes_enviados": estatisticas["bytes_recebidos"],
+                    "bytes_recebidos": estatisticas["bytes_enviados"],
+                    "erros_429": estatisticas["erros_429"],
+                    "segundos": duracao,
+                })
+        finally:
+            escrivao.REGISTRO_ENVIOS = registro_original
+            definir_cliente_sheets(None)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do envio ao Censo contra a Sheets API simulada")
+    parser.add_argument("--leitos", type=int, nargs="+", default=[10, 35, 70])
+    parser.add_argument("--exames", type=int, default=3, help="exames por paciente")
+    parser.add_argument("--latencia", type=float, default=0.05, help="segundos por requisição")
+    parser.add_argument("--prob-429", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"{'leitos':>6} {'rodada':<15} {'ok':<3} {'linhas':>6} {'chamadas':>8} {'enviados':>9} "
+          f"{'recebidos':>9} {'429':>4} {'tempo(s)':>8}  detalhe")
+    for leitos in args.leitos:
+        for r in medir(leitos, args.exames, args.latencia, args.prob_429):
+            print(f"{r['leitos']:>6} {r['rodada']:<15} {'sim' if r['sucesso'] else 'não':<3} {r['linhas']:>6} "
+                  f"{r['chamadas']:>8} {r['bytes_enviados']:>9} {r['bytes_recebidos']:>9} {r['erros_429']:>4} "
+                  f"{r['segundos']:>8.2f}  {r['detalhe']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# cache_extracao.py - Cache em disco (SQLite) dos registros extraídos dos PDFs
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+DIRETORIO_DADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados")
+
+# Limites de evicção
+MAX_BYTES_CACHE = 50 * 1024 * 1024
+MAX_IDADE_CACHE_DIAS = 60
+
+
+def hash_arquivo(filepath, tamanho_bloco=1024 * 1024):
+    """SHA-256 do conteúdo do arquivo"""
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _serializar(registro):
+    return json.dumps(
+        {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in registro.items()},
+        ensure_ascii=False,
+    )
+
+
+def _desserializar(texto):
+    registro = json.loads(texto)
+    if registro.get("Data"):
+        registro["Data"] = datetime.fromisoformat(registro["Data"])
+    return registro
+
+
+class CacheExtracao:
+    """
+    Cache de registros por (hash do PDF, versão dos padrões).
+
+    Quando a versão muda (um regex de definir_padroes foi alterado), as
+    entradas antigas deixam de ser encontradas e são removidas na próxima evicção.
+    """
+
+    def __init__(self, caminho, max_bytes=MAX_BYTES_CACHE, max_idade_dias=MAX_IDADE_CACHE_DIAS):
+        self.caminho = caminho
+        self.max_bytes = max_bytes
+        self.max_idade_dias = max_idade_dias
+
+    @contextmanager
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS registros (
+                    hash TEXT NOT NULL,
+                    versao TEXT NOT NULL,
+                    registro TEXT NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    criado_em REAL NOT NULL,
+                    acessado_em REAL NOT NULL,
+                    PRIMARY KEY (hash, versao)
+                )"""
+            )
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def obter_varios(self, hashes, versao):
+        """Retorna {hash: registro} para os hashes presentes no cache"""
+        hashes = list(dict.fromkeys(hashes))
+        encontrados = {}
+        if not hashes:
+            return encontrados
+
+        agora = time.time()
+        with self._conectar() as conn:
+            for i in range(0, len(hashes), 500):
+                lote = hashes[i:i + 500]
+                marcadores = ",".join("?" * len(lote))
+                linhas = conn.execute(
+                    f"SELECT hash, registro FROM registros WHERE versao = ? AND hash IN ({marcadores})",
+                    [versao, *lote],
+                ).fetchall()
+                for h, texto in linhas:
+                    encontrados[h] = _desserializar(texto)
+            if encontrados:
+                conn.executemany(
+                    "UPDATE registros SET acessado_em = ? WHERE versao = ? AND hash = ?",
+                    [(agora, versao, h) for h in encontrados],
+                )
+        return encontrados
+
+    def gravar_varios(self, itens, versao):
+        """Grava uma lista de (hash, registro)"""
+        if not itens:
+            return
+        agora = time.time()
+        linhas = []
+        for h, registro in itens:
+            texto = _serializar(registro)
+            linhas.append((h, versao, texto, len(texto.encode("utf-8")), agora, agora))
+        with self._conectar() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO registros VALUES (?, ?, ?, ?, ?, ?)", linhas
+            )
+
+    def aplicar_eviccao(self, versao):
+        """Remove versões antigas, entradas expiradas e as menos usadas acima do limite de tamanho"""
+        limite_idade = time.time() - self.max_idade_dias * 86400
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM registros WHERE versao != ?", (versao,))
+            conn.execute("DELETE FROM registros WHERE acessado_em < ?", (limite_idade,))
+
+            total = conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM registros").fetchone()[0]
+            if total > self.max_bytes:
+                excedente = total - self.max_bytes
+                removidos = []
+                for h, v, tamanho in conn.execute(
+                    "SELECT hash, versao, tamanho FROM registros ORDER BY acessado_em"
+                ):
+                    removidos.append((h, v))
+                    excedente -= tamanho
+                    if excedente <= 0:
+                        break
+                conn.executemany("DELETE FROM registros WHERE hash = ? AND versao = ?", removidos)
+
+    def limpar(self):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM registros")
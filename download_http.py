@@ -0,0 +1,164 @@
+# download_http.py - Download direto (HTTP) dos laudos usando os cookies da sessão logada no navegador
+
+import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Downloads simultâneos por paciente
+WORKERS_DOWNLOAD_HTTP = 4
+TIMEOUT_DOWNLOAD_HTTP = 60
+TAMANHO_BLOCO_HTTP = 64 * 1024
+
+# URL que o botão abriria: link em volta, atributo data-*, window.open/location
+# no onclick, ou formaction de formulário GET. Postbacks do ASP.NET (POST com
+# __VIEWSTATE) não têm URL própria e ficam de fora.
+_JS_URL_DO_BOTAO = r"""
+const botao = arguments[0];
+const absoluta = (u) => { try { return new URL(u, document.baseURI).href; } catch (e) { return null; } };
+const link = botao.closest('a[href]');
+if (link && !link.getAttribute('href').trim().toLowerCase().startsWith('javascript:')) {
+    return absoluta(link.getAttribute('href'));
+}
+for (const atributo of ['data-url', 'data-href', 'data-link', 'href']) {
+    const valor = botao.getAttribute(atributo);
+    if (valor) { return absoluta(valor); }
+}
+const onclick = botao.getAttribute('onclick') || '';
+const achado = onclick.match(/(?:window\.open|location\.assign|location\.replace)\s*\(\s*['"]([^'"]+)['"]|location(?:\.href)?\s*=\s*['"]([^'"]+)['"]/);
+if (achado) { return absoluta(achado[1] || achado[2]); }
+const formaction = botao.getAttribute('formaction');
+const formulario = botao.form;
+if (formaction && formulario && (formulario.getAttribute('method') || 'get').toLowerCase() === 'get') {
+    return absoluta(formaction);
+}
+return null;
+"""
+
+
+def nome_arquivo_laudo(paciente, indice):
+    """Nome determinístico do PDF: paciente sem acentos + posição do laudo na pesquisa"""
+    texto = unicodedata.normalize("NFKD", paciente).encode("ASCII", "ignore").decode("ascii")
+    base = re.sub(r"[^A-Za-z0-9]+", "_", texto).strip("_").upper() or "PACIENTE"
+    return f"{base}_{indice + 1:02d}.pdf"
+
+
+def destino_unico(pasta, nome):
+    """Caminho livre na pasta para nome: nome, nome_2, nome_3..."""
+    base, ext = os.path.splitext(nome)
+    destino = os.path.join(pasta, nome)
+    n = 2
+    while os.path.exists(destino):
+        destino = os.path.join(pasta, f"{base}_{n}{ext}")
+        n += 1
+    return destino
+
+
+def _publicar(temporario, destino):
+    """
+    Dá ao arquivo temporário o nome destino, ou destino_2... se já existir:
+    um laudo reaproveitado pode estar com o nome que a posição do botão daria.
+    Nunca sobrescreve. Retorna o caminho final.
+    """
+    pasta, nome = os.path.split(destino)
+    while True:
+        final = destino_unico(pasta, nome)
+        try:
+            os.link(temporario, final)
+        except FileExistsError:
+            continue
+        except OSError:
+            # Sistema de arquivos sem hard link: rename, com a checagem de destino_unico
+            os.rename(temporario, final)
+            return final
+        os.remove(temporario)
+        return final
+
+
+def criar_sessao_http(driver, workers=WORKERS_DOWNLOAD_HTTP):
+    """requests.Session com keep-alive, o User-Agent do navegador e os cookies da sessão logada"""
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=workers, max_retries=2)
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    try:
+        sessao.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+    except Exception:
+        pass
+    copiar_cookies(driver, sessao)
+    return sessao
+
+
+def copiar_cookies(driver, sessao):
+    """Atualiza os cookies da sessão HTTP com os do navegador (o ASP.NET pode renová-los)"""
+    for cookie in driver.get_cookies():
+        sessao.cookies.set(
+            cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/")
+        )
+    try:
+        sessao.headers["Referer"] = driver.current_url
+    except Exception:
+        pass
+
+
+def urls_dos_laudos(driver, botoes):
+    """URL de cada botão "Laudo Completo", ou None quando o botão não tem uma"""
+    urls = []
+    for botao in botoes:
+        try:
+            urls.append(driver.execute_script(_JS_URL_DO_BOTAO, botao))
+        except Exception:
+            urls.append(None)
+    return urls
+
+
+def baixar_laudo(sessao, url, destino, timeout=TIMEOUT_DOWNLOAD_HTTP):
+    """
+    Grava a resposta em destino (via .part), sem sobrescrever arquivo existente;
+    falha se não vier um PDF. Retorna o caminho final.
+    """
+    temporario = f"{destino}.part"
+    try:
+        with sessao.get(url, stream=True, timeout=timeout) as resposta:
+            resposta.raise_for_status()
+            inicio = True
+            with open(temporario, "wb") as f:
+                for bloco in resposta.iter_content(TAMANHO_BLOCO_HTTP):
+                    if not bloco:
+                        continue
+                    if inicio:
+                        if not bloco.lstrip().startswith(b"%PDF"):
+                            raise ValueError(f"resposta não é PDF ({resposta.headers.get('Content-Type')})")
+                        inicio = False
+                    f.write(bloco)
+            if inicio:
+                raise ValueError("resposta vazia")
+        destino = _publicar(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return destino
+
+
+def baixar_laudos(sessao, paciente, itens, pasta, workers=WORKERS_DOWNLOAD_HTTP):
+    """
+    Baixa em paralelo os itens [(índice do botão, url)] do paciente para a pasta.
+
+    Retorna {índice: (caminho, None)} para os que deram certo e
+    {índice: (None, erro)} para os que falharam.
+    """
+    os.makedirs(pasta, exist_ok=True)
+
+    def baixar(item):
+        indice, url = item
+        destino = os.path.join(pasta, nome_arquivo_laudo(paciente, indice))
+        try:
+            return indice, (baixar_laudo(sessao, url, destino), None)
+        except Exception as e:
+            return indice, (None, e)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(itens)))) as executor:
+        return dict(executor.map(baixar, itens))
@@ -1,11 +1,20 @@
 # escrivao.py - Otimizado para rodar na VM Linux e buscar nomes pela aba "CENSO AUTOMÁTICO" (colunas A e D)
 
 import gspread
+from gspread.utils import absolute_range_name, extract_id_from_url
 from google.oauth2.service_account import Credentials
+import numpy as np
 import pandas as pd
-import unicodedata
+import threading
 import time
-from datetime import datetime, timedelta
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from armazem import ARMAZEM, colapsar_duplicados
+from janela import HORA_CORTE_PADRAO, IndiceTemporal, dentro_da_janela
+from limitador import QUOTA_POR_MINUTO, LimitadorTaxa
+from nomes import IndiceNomes
+from registro_envios import REGISTRO_ENVIOS
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
@@ -23,138 +32,522 @@ COLUNAS_GOOGLE = [
 
 COLUNAS_PLANILHA = ["A"] + list("HIJKLMNOPQRST")
 
+# Intervalos por chamada values_batch_update
+MAX_INTERVALOS_POR_LOTE = 500
+
+# Todas as chamadas à Sheets API passam por aqui
+LIMITADOR = LimitadorTaxa()
+
+# Validade (segundos) dos metadados em cache. O censo (leito -> paciente) não
+# entra no cache: muda quando um paciente troca de leito e é relido a cada envio.
+TTL_PLANILHA = 30 * 60
+TTL_ABAS = 10 * 60
+
+class CacheTTL:
+    """Dicionário com validade por entrada, seguro entre threads"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._itens = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave, criar):
+        """Valor em cache para a chave, ou criar() se ausente/expirado"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item and item[0] > time.monotonic():
+                return item[1]
+        valor = criar()
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+        return valor
+
+    def invalidar(self, chave=None):
+        with self._lock:
+            if chave is None:
+                self._itens.clear()
+            else:
+                self._itens.pop(chave, None)
+
+_cliente = None
+_lock_cliente = threading.Lock()
+_CACHE_PLANILHAS = CacheTTL(TTL_PLANILHA)
+_CACHE_ABAS = CacheTTL(TTL_ABAS)
+_locks_planilhas = {}
+_lock_locks = threading.Lock()
+
 def conectar_google_sheets():
+    """
+    Cliente autorizado, criado uma vez por processo. As credenciais renovam o
+    token sozinhas quando ele expira, então o mesmo cliente serve a todos os envios.
+    """
+    global _cliente
+    with _lock_cliente:
+        if _cliente is None:
+            try:
+                creds = Credentials.from_service_account_file(CAMINHO_CREDENCIAIS, scopes=SCOPES)
+                _cliente = gspread.authorize(creds)
+            except Exception as e:
+                print(f"Erro na autenticação: {e}")
+                return None
+        return _cliente
+
+def definir_cliente_sheets(gc):
+    """Troca o cliente do processo (por exemplo, por um ligado a outro servidor) e limpa os caches"""
+    global _cliente
+    with _lock_cliente:
+        _cliente = gc
+    invalidar_cache_sheets()
+
+def invalidar_cache_sheets(url=None):
+    """Descarta planilha e abas em cache (de uma planilha, ou de todas com url None)"""
+    if url is None:
+        for cache in (_CACHE_PLANILHAS, _CACHE_ABAS):
+            cache.invalidar()
+        return
+    _CACHE_PLANILHAS.invalidar(url)
     try:
-        creds = Credentials.from_service_account_file(CAMINHO_CREDENCIAIS, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as e:
-        print(f"Erro na autenticação: {e}")
-        return None
-
-def abrir_planilha_por_url(gc, url):
+        id_planilha = extract_id_from_url(url)
+    except gspread.exceptions.NoValidUrlKeyFound:
+        return
+    _CACHE_ABAS.invalidar(id_planilha)
+
+def _lock_planilha(id_planilha):
+    """
+    Um lock por planilha: dois envios à mesma planilha (a fila em segundo
+    plano e um envio da página, ou dois usuários) calculariam a mesma linha
+    livre e gravariam um por cima do outro.
+    """
+    with _lock_locks:
+        return _locks_planilhas.setdefault(id_planilha, threading.Lock())
+
+def abrir_planilha_por_url(gc, url, limitador=LIMITADOR):
     try:
-        return gc.open_by_url(url)
+        return _CACHE_PLANILHAS.obter(url, lambda: limitador.executar(gc.open_by_url, url))
     except Exception as e:
         print(f"Erro ao abrir a planilha: {e}")
         return None
 
+def _formatar_numero(valor):
+    if pd.isna(valor) or np.isinf(valor):
+        return ""
+    # Representação mais curta que identifica o valor no próprio tipo (float32 ou float64)
+    return np.format_float_positional(valor, trim="-")
+
+def formatar_para_planilha(df):
+    """Converte o DataFrame tipado do extrator nos textos escritos em COLUNAS_GOOGLE"""
+    saida = pd.DataFrame(index=df.index)
+    saida["Data"] = pd.to_datetime(df["Data"]).dt.strftime("%d/%m/%Y %H:%M").fillna("")
+    for col in COLUNAS_GOOGLE[1:]:
+        if col not in df.columns:
+            saida[col] = ""
+        elif pd.api.types.is_float_dtype(df[col]):
+            saida[col] = [_formatar_numero(v) for v in df[col].to_numpy()]
+        else:
+            saida[col] = [
+                "" if pd.isna(v) or str(v).lower() == "nan" else str(v)
+                for v in df[col].to_numpy()
+            ]
+
+    if "Cálcio Total" in df.columns:
+        total = df["Cálcio Total"].fillna(False).astype(bool) & (saida["Cálcio"] != "")
+        saida.loc[total, "Cálcio"] = saida.loc[total, "Cálcio"] + " (t)"
+    return saida
+
 def normalizar_nome(nome):
     return unicodedata.normalize("NFKD", nome).encode("ASCII", "ignore").decode("utf-8").lower().strip()
 
-def enviar_para_google_sheets(df, url, data_referencia=None, barra_progresso=None):
-    gc = conectar_google_sheets()
-    if not gc:
-        return False
-
-    planilha = abrir_planilha_por_url(gc, url)
-    if not planilha:
-        return False
-
-    df["Data"] = pd.to_datetime(df["Data"], errors="coerce")
-    df = df[df["Data"].notna()]
-    df["Data_agrup"] = df["Data"].dt.normalize()
+def preparar_exames(df, data_referencia=None, hora_corte=HORA_CORTE_PADRAO):
+    """
+    Exames da janela, ordenados por paciente e data, já formatados para a planilha.
+
+    df pode ser um DataFrame ou um iterável de registros (por exemplo
+    extrator.iter_exames); nesse caso só os registros da janela de data são guardados.
+    Com df None, os exames da janela são lidos do armazém local. Retorna None se
+    não houver exames.
+    """
+    if df is None:
+        df = ARMAZEM.ler_janela(data_referencia, hora_corte) if data_referencia else None
+        if df is None:
+            print("Nenhum exame no armazém local para a data de referência.")
+            return None
+
+    if not isinstance(df, pd.DataFrame):
+        registros = df
+        if data_referencia:
+            registros = (r for r in registros if dentro_da_janela(r.get("Data"), data_referencia, hora_corte))
+        df = pd.DataFrame(list(registros), columns=["Paciente"] + COLUNAS_GOOGLE + ["Cálcio Total"])
+
+    df = df.assign(Data=pd.to_datetime(df["Data"], errors="coerce"))
+    df = colapsar_duplicados(df[df["Data"].notna()])
 
     if data_referencia:
-        data_ref = pd.to_datetime(data_referencia).normalize()
-        data_véspera = data_ref - timedelta(days=1)
-        hora_corte = pd.to_timedelta("11:30:00")
-
-        df = df[((df["Data_agrup"] == data_ref) |
-                 ((df["Data_agrup"] == data_véspera) &
-                  (df["Data"].dt.time >= (datetime.min + hora_corte).time())))]
+        df = IndiceTemporal(df).janela(data_referencia, hora_corte)
 
     df = df.sort_values(["Paciente", "Data"])
-    df["Data"] = df["Data"].dt.strftime("%d/%m/%Y %H:%M")
-    df_grouped = df[["Paciente"] + COLUNAS_GOOGLE].copy()
-
-    nomes_df = df_grouped["Paciente"].dropna().tolist()
-    nomes_normalizados = {normalizar_nome(n): n for n in nomes_df}
-
-    try:
-        dados_censo = planilha.worksheet("CENSO AUTOMÁTICO").get("A19:D88")
-        time.sleep(1)
-        aba_para_paciente = {
-            linha[0].zfill(2): linha[3].strip().title()
-            for linha in dados_censo
-            if len(linha) >= 4 and linha[0] and linha[3]
+    return pd.concat([df[["Paciente"]], formatar_para_planilha(df)], axis=1)
+
+def ler_censo(planilha, limitador=LIMITADOR):
+    """
+    Mapeia o número da aba (leito) para o nome do paciente na aba "CENSO
+    AUTOMÁTICO". Sempre lido na hora (uma chamada values_get): um censo
+    antigo mandaria exames para a aba de quem ocupa o leito agora.
+    """
+    resposta = limitador.executar(planilha.values_get, absolute_range_name("CENSO AUTOMÁTICO", "A19:D88"))
+    return {
+        linha[0].zfill(2): linha[3].strip().title()
+        for linha in resposta.get("values", [])
+        if len(linha) >= 4 and linha[0] and linha[3]
+    }
+
+def _agrupar_escritas(escritas):
+    """
+    Converte as escritas (aba, linha, valores, paciente) em intervalos contíguos
+    por aba: um para a coluna A e um para H:T. Cada intervalo leva também as
+    (aba, linha) que cobre, em "linhas", que não vai para a API.
+    """
+    dados_a = []
+    dados_ht = []
+    por_aba = {}
+    for titulo, linha, valores, _ in escritas:
+        por_aba.setdefault(titulo, []).append((linha, valores))
+
+    for titulo, linhas in por_aba.items():
+        linhas.sort()
+        inicio = 0
+        while inicio < len(linhas):
+            fim = inicio
+            while fim + 1 < len(linhas) and linhas[fim + 1][0] == linhas[fim][0] + 1:
+                fim += 1
+            bloco = linhas[inicio:fim + 1]
+            primeira, ultima = bloco[0][0], bloco[-1][0]
+            cobertas = [(titulo, linha) for linha, _ in bloco]
+            dados_a.append({
+                "range": absolute_range_name(titulo, f"A{primeira}:A{ultima}"),
+                "values": [[valores[0]] for _, valores in bloco],
+                "linhas": cobertas,
+            })
+            dados_ht.append({
+                "range": absolute_range_name(titulo, f"H{primeira}:T{ultima}"),
+                "values": [valores[1:13] for _, valores in bloco],
+                "linhas": cobertas,
+            })
+            inicio = fim + 1
+    return dados_a, dados_ht
+
+def enviar_escritas(planilha, escritas, limitador=LIMITADOR):
+    """
+    Grava as escritas (aba, linha, valores, paciente) com poucas chamadas
+    values_batch_update.
+
+    H:T vai antes, como RAW, e a coluna A por último, como USER_ENTERED (a
+    data vira data na planilha), só nas linhas cujos valores foram gravados:
+    a data na coluna A é o que marca a linha como enviada, então não pode
+    ficar numa linha sem resultados. Se a data falhar, é tentada mais uma
+    vez; se falhar de novo, H:T dessas linhas é apagado. Erros de cota e 5xx
+    são repetidos pelo limitador; só o que falhar de vez volta em erros,
+    como (exceção, lote).
+    Retorna (intervalos gravados, erros).
+    """
+    dados_a, dados_ht = _agrupar_escritas(escritas)
+    gravados = []
+    erros = []
+
+    def enviar(opcao, dados):
+        for i in range(0, len(dados), MAX_INTERVALOS_POR_LOTE):
+            lote = dados[i:i + MAX_INTERVALOS_POR_LOTE]
+            corpo = {
+                "valueInputOption": opcao,
+                "data": [{"range": d["range"], "values": d["values"]} for d in lote],
+            }
+            try:
+                resposta = limitador.executar(planilha.values_batch_update, corpo)
+                gravados.extend(r.get("updatedRange") for r in resposta.get("responses", []))
+            except Exception as e:
+                print(f"Erro ao gravar lote de {len(lote)} intervalos: {e}")
+                erros.append((e, lote))
+
+    enviar("RAW", dados_ht)
+    sem_valores = {linha for _, lote in erros for d in lote for linha in d["linhas"]}
+    falhas_ht = len(erros)
+    enviar("USER_ENTERED", [d for d in dados_a if not sem_valores.intersection(d["linhas"])])
+
+    if len(erros) > falhas_ht:
+        # H:T já gravado e a data não: tenta a coluna A mais uma vez
+        sem_data = [d for _, lote in erros[falhas_ht:] for d in lote]
+        del erros[falhas_ht:]
+        enviar("USER_ENTERED", sem_data)
+        sem_data = {linha for _, lote in erros[falhas_ht:] for d in lote for linha in d["linhas"]}
+        if sem_data:
+            _limpar_valores(planilha, [d for d in dados_ht if sem_data.intersection(d["linhas"])], limitador)
+    return gravados, erros
+
+def _limpar_valores(planilha, dados_ht, limitador):
+    """
+    Apaga H:T das linhas cuja data não pôde ser gravada, para que a linha não
+    fique ocupada por resultados sem data e o próximo envio use a mesma linha.
+    """
+    for i in range(0, len(dados_ht), MAX_INTERVALOS_POR_LOTE):
+        lote = dados_ht[i:i + MAX_INTERVALOS_POR_LOTE]
+        corpo = {
+            "valueInputOption": "RAW",
+            "data": [
+                {"range": d["range"], "values": [[""] * len(valores) for valores in d["values"]]}
+                for d in lote
+            ],
         }
-    except Exception as e:
-        print(f"❌ Erro ao acessar 'CENSO AUTOMÁTICO': {e}")
-        return False
-
-    total_preenchido = 0
-    total_abas = 0
-
-    todas_abas = []
-    for i in range(1, 71):
-        aba_nome = f"{i:02d}"
         try:
-            aba = planilha.worksheet(aba_nome)
-            todas_abas.append(aba)
-        except gspread.exceptions.WorksheetNotFound:
+            limitador.executar(planilha.values_batch_update, corpo)
+        except Exception as e:
+            print(f"Erro ao apagar {len(lote)} intervalos sem data: {e}")
+
+ABAS_LEITOS = [f"{i:02d}" for i in range(1, 71)]
+
+def mapear_abas(planilha, limitador=LIMITADOR):
+    """
+    Título -> worksheet das abas de leito ("01" a "70"), com uma única leitura
+    de metadados. Fica em cache por TTL_ABAS segundos.
+    """
+    return _CACHE_ABAS.obter(
+        planilha.id,
+        lambda: {aba.title: aba for aba in limitador.executar(planilha.worksheets) if aba.title in ABAS_LEITOS},
+    )
+
+# Datas da planilha vêm como número de série (dias desde 30/12/1899)
+_EPOCA_PLANILHA = pd.Timestamp("1899-12-30")
+
+def chave_data(valor):
+    """Data/hora de uma célula ou de um texto "dd/mm/aaaa hh:mm", como "aaaa-mm-ddThh:mm"; None se não for data"""
+    if valor is None or valor == "":
+        return None
+    if isinstance(valor, (int, float)):
+        data = _EPOCA_PLANILHA + pd.to_timedelta(valor, unit="D")
+    else:
+        data = pd.to_datetime(str(valor).strip(), dayfirst=True, errors="coerce")
+    if pd.isna(data):
+        return None
+    return data.round("min").strftime("%Y-%m-%dT%H:%M")
+
+def ler_abas_leitos(planilha, titulos, limitador=LIMITADOR):
+    """
+    Para cada aba, (próxima linha livre, datas já presentes na coluna A), com
+    um único values_batch_get.
+
+    Lê a aba inteira (não só a coluna A): assim a linha livre é a mesma que
+    len(get_all_values()) + 1 dava, mesmo quando a última linha preenchida
+    não tem data na coluna A. Os valores vêm sem formatação, para a data da
+    coluna A não depender do formato de exibição da planilha.
+    """
+    titulos = list(titulos)
+    if not titulos:
+        return {}
+    resposta = limitador.executar(
+        planilha.values_batch_get,
+        [absolute_range_name(t) for t in titulos],
+        params={"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "SERIAL_NUMBER"},
+    )
+    abas = {}
+    for titulo, intervalo in zip(titulos, resposta.get("valueRanges", [])):
+        valores = intervalo.get("values", [])
+        datas = {chave_data(linha[0]) for linha in valores if linha}
+        datas.discard(None)
+        abas[titulo] = (len(valores) + 1, datas)
+    return abas
+
+def planejar_escritas(planilha, df_grouped, aba_para_paciente, barra_progresso=None, limitador=LIMITADOR,
+                      enviados=frozenset(), ambiguos=None):
+    """
+    Decide, para cada aba de paciente com exames, em que linhas gravar cada exame.
+
+    O nome do censo é casado com os nomes dos resultados por IndiceNomes, que
+    tolera abreviações e nomes do meio ausentes, um para um: cada paciente dos
+    resultados vai para no máximo um leito. Leitos com mais de um candidato
+    próximo, ou que disputam o mesmo paciente com outro leito, não recebem
+    nada e vão para ambiguos (lista), se passada. Resultados com nomes de
+    mesmos tokens ("José Da Silva" e "Jose Silva") são somados num paciente só.
+    Exames cuja data já está na coluna A da aba, ou que constam em enviados
+    (conjunto de (aba, paciente normalizado, data) do registro), ficam de fora.
+    """
+    por_paciente = {
+        nome: grupo
+        for nome, grupo in df_grouped.groupby("Paciente", observed=True, sort=False)
+        if nome != "Paciente Desconhecido"
+    }
+    indice = IndiceNomes(por_paciente)
+
+    abas = mapear_abas(planilha, limitador)
+
+    censo = {
+        nome_aba: aba_para_paciente[nome_aba]
+        for nome_aba in ABAS_LEITOS
+        if nome_aba in abas and nome_aba not in ABAS_IGNORADAS and aba_para_paciente.get(nome_aba)
+    }
+    pacientes_por_aba, empates = indice.resolver(censo)
+    for nome_aba, nome_censo, candidatos in empates:
+        opcoes = ", ".join(f"{nome} ({pontuacao:.2f})" for nome, pontuacao in candidatos)
+        if len(candidatos) > 1:
+            print(f"⚠️ Aba {nome_aba}: '{nome_censo}' é ambíguo entre {opcoes}; nada foi enviado")
+        else:
+            print(f"⚠️ Aba {nome_aba}: '{nome_censo}' disputa {opcoes} com outro leito; nada foi enviado")
+    if ambiguos is not None:
+        ambiguos.extend(empates)
+
+    conteudo_abas = ler_abas_leitos(planilha, pacientes_por_aba, limitador)
+
+    escritas = []
+    total_abas = 0
+    total_aba_count = len(pacientes_por_aba)
+
+    for nome_aba, nome_correto in pacientes_por_aba.items():
+        variantes = indice.variantes[nome_correto]
+        dados_paciente = (
+            por_paciente[nome_correto] if len(variantes) == 1
+            else pd.concat([por_paciente[nome] for nome in variantes])
+        )
+        if dados_paciente.empty or nome_aba not in conteudo_abas:
             continue
 
-    total_aba_count = len(todas_abas)
-
-    for aba in todas_abas:
-        try:
-            nome_aba = aba.title
-            if nome_aba in ABAS_IGNORADAS:
+        linha_destino, datas_na_aba = conteudo_abas[nome_aba]
+        # Cópia: também evita gravar duas vezes a mesma data vinda de variantes do nome
+        datas_na_aba = set(datas_na_aba)
+        paciente = normalizar_nome(nome_correto)
+        for linha in dados_paciente[COLUNAS_GOOGLE].itertuples(index=False):
+            valores = (list(linha) + [""] * 13)[:13]
+            data = chave_data(valores[0])
+            if data in datas_na_aba or (nome_aba, paciente, data) in enviados:
                 continue
+            escritas.append((nome_aba, linha_destino, valores, paciente))
+            datas_na_aba.add(data)
+            linha_destino += 1
 
-            nome_paciente_b1 = aba_para_paciente.get(nome_aba)
-            if not nome_paciente_b1:
-                continue
+        total_abas += 1
+        if barra_progresso:
+            barra_progresso.progress(total_abas / total_aba_count)
 
-            nome_b1_normalizado = normalizar_nome(nome_paciente_b1)
+    return escritas
 
-            if nome_b1_normalizado not in nomes_normalizados:
-                continue
+def enviar_preparados(df_grouped, url, barra_progresso=None, relatorio=None, limitador=LIMITADOR, reenviar=False):
+    """
+    Envia exames já preparados (saída de preparar_exames) para uma planilha.
 
-            nome_correto = nomes_normalizados[nome_b1_normalizado]
-            dados_paciente = df_grouped[df_grouped["Paciente"] == nome_correto]
-            if dados_paciente.empty:
-                continue
+    Pode ser repetido sem duplicar linhas: o que já foi gravado é pulado.
+    Envios à mesma planilha são feitos um de cada vez (leitura, plano e escrita).
+    """
+    gc = conectar_google_sheets()
+    if not gc:
+        return False
 
-            dados_paciente = dados_paciente[COLUNAS_GOOGLE]
-            valores_aba = aba.get_all_values()
-            time.sleep(0.5)
-            linha_destino = len(valores_aba) + 1
-
-            for _, linha in dados_paciente.iterrows():
-                valores_formatados = []
-                for col in COLUNAS_GOOGLE:
-                    valor = linha.get(col, "")
-                    if pd.isna(valor) or valor in [float("inf"), float("-inf")] or (isinstance(valor, str) and valor.lower() == "nan"):
-                        valores_formatados.append("")
-                    else:
-                        valores_formatados.append(str(valor))
-
-                valores_formatados = (valores_formatados + [""] * 13)[:13]
-
-                try:
-                    aba.update_acell(f"A{linha_destino}", valores_formatados[0])
-                    time.sleep(0.5)
-                    range_escreve = f"H{linha_destino}:T{linha_destino}"
-                    aba.update(range_escreve, [valores_formatados[1:13]])
-                    time.sleep(0.5)
-                    total_preenchido += 1
-                    linha_destino += 1
-                except Exception:
-                    continue
-
-            total_abas += 1
-            if barra_progresso:
-                barra_progresso.progress(total_abas / total_aba_count)
+    planilha = abrir_planilha_por_url(gc, url, limitador)
+    if not planilha:
+        return False
 
-            time.sleep(1.0)
+    with _lock_planilha(planilha.id):
+        return _enviar_na_planilha(planilha, df_grouped, url, barra_progresso, relatorio, limitador, reenviar)
 
-        except Exception as e:
-            print(f"Erro ao processar aba {aba.title}: {e}")
-            continue
+def _enviar_na_planilha(planilha, df_grouped, url, barra_progresso, relatorio, limitador, reenviar):
+    try:
+        aba_para_paciente = ler_censo(planilha, limitador)
+    except Exception as e:
+        print(f"❌ Erro ao acessar 'CENSO AUTOMÁTICO': {e}")
+        return False
+
+    enviados = frozenset() if reenviar else REGISTRO_ENVIOS.enviados(planilha.id)
+    ambiguos = []
+    try:
+        escritas = planejar_escritas(
+            planilha, df_grouped, aba_para_paciente, barra_progresso, limitador, enviados, ambiguos
+        )
+    except Exception as e:
+        print(f"❌ Erro ao ler as abas dos pacientes: {e}")
+        invalidar_cache_sheets(url)
+        return False
+
+    gravados, erros = enviar_escritas(planilha, escritas, limitador)
+    if erros:
+        # Uma aba pode ter sido renomeada ou apagada; a próxima tentativa relê tudo
+        invalidar_cache_sheets(url)
+
+    falhas = {linha for _, lote in erros for d in lote for linha in d["linhas"]}
+    REGISTRO_ENVIOS.registrar(planilha.id, [
+        (titulo, paciente, chave_data(valores[0]))
+        for titulo, linha, valores, paciente in escritas
+        if (titulo, linha) not in falhas
+    ])
+
+    for intervalo in gravados:
+        print(f"Gravado: {intervalo}")
+    if relatorio is not None:
+        relatorio["intervalos"] = gravados
+        relatorio["falhas"] = [d["range"] for _, lote in erros for d in lote]
+        relatorio["linhas"] = len(escritas) - len(falhas)
+        relatorio["ambiguos"] = ambiguos
+
+    print(f"Total de abas processadas: {len({titulo for titulo, _, _, _ in escritas})}")
+    print(f"Total de linhas preenchidas: {len(escritas) - len(falhas)}")
+    return not erros
+
+def enviar_para_google_sheets(df, url, data_referencia=None, barra_progresso=None, hora_corte=HORA_CORTE_PADRAO,
+                              relatorio=None, limitador=LIMITADOR, reenviar=False):
+    """
+    Envia os exames para as abas dos pacientes no Censo (ver preparar_exames).
+
+    Todas as linhas de todas as abas são gravadas juntas em poucas chamadas de
+    lote, no ritmo do limitador. Só vão os exames que ainda não estão na aba
+    nem no registro de envios; com reenviar=True o registro é ignorado (a
+    conferência com a aba continua). Se relatorio (dict) for passado, recebe
+    os intervalos gravados e os que falharam.
+    """
+    df_grouped = preparar_exames(df, data_referencia, hora_corte)
+    if df_grouped is None:
+        return False
+    return enviar_preparados(df_grouped, url, barra_progresso, relatorio, limitador, reenviar)
+
+def enviar_para_varias_planilhas(df, urls, data_referencia=None, barra_progresso=None, hora_corte=HORA_CORTE_PADRAO,
+                                 relatorios=None, max_workers=4, reenviar=False):
+    """
+    Envia os mesmos exames para várias planilhas (uma por enfermaria) ao mesmo tempo.
+
+    Cada planilha recebe só os pacientes do seu próprio censo. As planilhas
+    rodam em threads, cada uma com seu limitador; como a cota é da conta de
+    serviço e não da planilha, QUOTA_POR_MINUTO é dividida entre elas.
+    Retorna {url: sucesso}; relatorios (dict), se passado, recebe {url: relatorio}.
+    """
+    urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))
+    if not urls:
+        return {}
+
+    df_grouped = preparar_exames(df, data_referencia, hora_corte)
+    if df_grouped is None:
+        return {url: False for url in urls}
+
+    # Autentica antes de abrir as threads, para não autorizar várias vezes
+    if not conectar_google_sheets():
+        return {url: False for url in urls}
+
+    cota = max(1, QUOTA_POR_MINUTO // len(urls))
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        futuros = {}
+        for url in urls:
+            relatorio = {}
+            if relatorios is not None:
+                relatorios[url] = relatorio
+            # A barra de progresso do Streamlit só pode ser atualizada pela thread principal
+            futuro = executor.submit(
+                enviar_preparados, df_grouped, url, None, relatorio, LimitadorTaxa(cota), reenviar
+            )
+            futuros[futuro] = url
+
+        for concluidas, futuro in enumerate(as_completed(futuros), start=1):
+            url = futuros[futuro]
+            try:
+                resultados[url] = futuro.result()
+            except Exception as e:
+                print(f"❌ Erro ao enviar para {url}: {e}")
+                resultados[url] = False
+            if barra_progresso:
+                barra_progresso.progress(concluidas / len(urls))
 
-    print(f"Total de abas processadas: {total_abas}")
-    print(f"Total de linhas preenchidas: {total_preenchido}")
-    return True
+    return resultados
 
-__all__ = ["enviar_para_google_sheets"]
+__all__ = ["enviar_para_google_sheets", "enviar_para_varias_planilhas", "invalidar_cache_sheets"]
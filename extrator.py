@@ -1,11 +1,42 @@
 # extrator.py - Versão híbrida para uso em Streamlit e via chamada externa
 
 import fitz  # PyMuPDF
+import gc
+import hashlib
+import json
 import re
+import time
+from functools import lru_cache
 import pandas as pd
 import os
+import psutil
 import streamlit as st
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+from armazem import ARMAZEM, colapsar_duplicados
+from janela import HORA_CORTE_PADRAO, IndiceTemporal
+from cache_extracao import CacheExtracao, DIRETORIO_DADOS, hash_arquivo
+from manifesto import ler_manifesto
+
+# Número de processos usados na extração em paralelo (1 = sequencial)
+WORKERS_EXTRACAO = max(1, os.cpu_count() or 1)
+
+# Modo em lotes: PDFs por lote e teto de memória (processo + workers)
+TAMANHO_LOTE_PADRAO = 200
+LIMITE_MEMORIA_MB = 1024
+
+# Intervalo mínimo (segundos) entre redesenhos da tabela ao vivo
+INTERVALO_TABELA_AO_VIVO = 0.5
+
+# Incrementar quando a lógica de extração (fora de definir_padroes) mudar o registro gerado
+VERSAO_EXTRATOR = 3
+
+# Plaquetas passam de 10^5 e vêm com separador de milhar; os demais analitos cabem em float32
+ANALITOS_FLOAT64 = {"Plaquetas"}
+
+CACHE = CacheExtracao(os.path.join(DIRETORIO_DADOS, "cache_extracao.sqlite"))
 
 definir_padroes = lambda: {
     "Creatinina": r"CREATININA.*?\n.*?([\d,\.]+)",
@@ -13,22 +44,36 @@ definir_padroes = lambda: {
     "Bicarbonato": r"BICARBONATO.*?\n.*?([\d,\.]+)",
     "Sódio": r"S[ÓO]DIO.*?\n.*?([\d,\.]+)",
     "Potássio": r"POT[ÁA]SSIO.*?\n.*?([\d,\.]+)",
-    "Magnésio": r"MAGN[ÉE]SIO.*?RESULTADO\\s*:?.*?([\d,\.]+)",
-    "Cálcio": r"C[ÁA]LCIO\\s*(?!IONICO|I[ÔO]NICO).*?RESULTADO\\s*:?[\\s\\n]*([\d,\.]+)",
-    "Cálcio Iônico": r"C[ÁA]LCIO I[ÔO]NICO.*?RESULTADO\\s*:?.*?([\d,\.]+)",
+    "Magnésio": r"MAGN[ÉE]SIO.*?RESULTADO\s*:?.*?([\d,\.]+)",
+    "Cálcio": r"C[ÁA]LCIO\s*(?!IONICO|I[ÔO]NICO).*?RESULTADO\s*:?[\s\n]*([\d,\.]+)",
+    "Cálcio Iônico": r"C[ÁA]LCIO I[ÔO]NICO.*?RESULTADO\s*:?.*?([\d,\.]+)",
     "Fósforo": r"F[ÓO]SFORO.*?\n.*?([\d,\.]+)",
-    "Hemoglobina": r"HEMOGLOBINA\\s*:\\s*([\d,\.]+)",
-    "Plaquetas": r"PLAQUETAS.*?:\\s*([\d,\.]+)",
+    "Hemoglobina": r"HEMOGLOBINA\s*:\s*([\d,\.]+)",
+    "Plaquetas": r"PLAQUETAS.*?:\s*([\d,\.]+)",
     "Proteína C Reativa": r"PROTE[ÍI]NA C REATIVA.*?([\d,\.]+)",
 }
 
+def versao_padroes():
+    """Identifica a versão dos padrões; muda sempre que um regex de definir_padroes muda"""
+    conteudo = json.dumps([VERSAO_EXTRATOR, definir_padroes()], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:16]
+
 def extrair_texto_pdf(filepath):
     with fitz.open(filepath) as doc:
         return "\n".join(page.get_text() for page in doc)
 
+def iterar_paginas_pdf(filepath):
+    """Texto de cada página; a página seguinte só é lida quando pedida"""
+    with fitz.open(filepath) as doc:
+        for page in doc:
+            yield page.get_text()
+
+# Linha em maiúsculas (com acentos, apóstrofo e hífen) logo acima de "Nome:"
+_PADRAO_NOME = re.compile(r"^[ \t]*([A-ZÀ-ÖØ-Þ][A-ZÀ-ÖØ-Þ' \t.-]*?)[ \t]*\r?\nNome\s*:", re.MULTILINE)
+
 def extrair_nome(texto):
-    match = re.search(r"^\s*([A-Z\s]+)\nNome\s*:", texto, flags=re.MULTILINE)
-    return match.group(1).strip().title() if match else "Paciente Desconhecido"
+    match = _PADRAO_NOME.search(texto)
+    return " ".join(match.group(1).split()).title() if match else "Paciente Desconhecido"
 
 def extrair_data_amostra(texto):
     match = re.search(r"Amostra recebida em:\s*(\d{2}/\d{2}/\d{4})\s+as\s+(\d{2})h\s+(\d{2})min", texto)
@@ -42,54 +87,651 @@ def extrair_data_amostra(texto):
             return None
     return None
 
-def extrair_valores(texto, padroes):
-    resultados = {}
-    for exame, padrao in padroes.items():
-        match = re.search(padrao, texto, re.IGNORECASE | re.DOTALL)
-        resultados[exame] = match.group(1).replace(",", ".") if match else ""
+FLAGS_PADROES = re.IGNORECASE | re.DOTALL
+
+# Prefixo literal de um padrão: letras, espaços e classes [..] antes do primeiro metacaractere
+_PREFIXO_ANCORA = re.compile(r"(?:\[[^\]\\]*\]|[^\W\d_]| )+")
 
-    if resultados.get("Cálcio Iônico"):
+def _ancora(padrao):
+    """
+    Prefixo do padrão que toda ocorrência precisa ter no início, ou None.
+
+    Só é seguro quando o prefixo não é seguido de quantificador e o padrão não
+    tem alternância no nível externo.
+    """
+    match = _PREFIXO_ANCORA.match(padrao)
+    if not match or not match.group(0).strip():
+        return None
+    if padrao[match.end():match.end() + 1] in ("?", "*", "+", "{"):
+        return None
+
+    profundidade = 0
+    escapado = em_classe = False
+    for c in padrao:
+        if escapado:
+            escapado = False
+        elif c == "\\":
+            escapado = True
+        elif em_classe:
+            em_classe = c != "]"
+        elif c == "[":
+            em_classe = True
+        elif c == "(":
+            profundidade += 1
+        elif c == ")":
+            profundidade -= 1
+        elif c == "|" and profundidade == 0:
+            return None
+    return match.group(0)
+
+def _iniciais(ancora):
+    """Caracteres possíveis no início da âncora (None se não der para saber)"""
+    if ancora.startswith("["):
+        classe = ancora[1:ancora.index("]")]
+        return None if classe.startswith("^") or "-" in classe else set(classe)
+    return {ancora[0]}
+
+# Caracteres cuja equivalência sem caixa no re não é preservada por str.lower()
+_CASEFOLD_ESPECIAL = ("ı", "İ", "ſ")
+
+class ScannerAnalitos:
+    """
+    Localiza todos os analitos numa única passada pelo texto.
+
+    Um regex combinado com as âncoras de todos os padrões percorre o texto uma
+    vez, em ordem; o padrão completo de cada analito só é testado nas posições
+    das suas âncoras. Como o padrão começa pela âncora, o primeiro match
+    encontrado é o mesmo que re.search devolveria. A varredura para assim que
+    todos os analitos pedidos estão resolvidos.
+    """
+
+    # Tamanho dos blocos de texto convertidos para minúsculas de cada vez
+    BLOCO = 8192
+
+    def __init__(self, padroes):
+        self.completos = {exame: re.compile(padrao, FLAGS_PADROES) for exame, padrao in padroes.items()}
+        self.ancoras = {}
+        self.ancoras_minusculas = {}
+        self.iniciais = {}
+        # Padrões "ÂNCORA.*?RESTO": o match é o primeiro RESTO depois da primeira
+        # âncora; se ali não houver RESTO, também não haverá depois das seguintes
+        self.restos = {}
+        maior_ancora = 0
+        for exame, padrao in padroes.items():
+            ancora = _ancora(padrao)
+            if not ancora:
+                continue
+            self.ancoras[exame] = re.compile(ancora, FLAGS_PADROES)
+            self.ancoras_minusculas[exame] = re.compile(ancora.lower())
+            self.iniciais[exame] = _iniciais(ancora.lower())
+            maior_ancora = max(maior_ancora, len(re.sub(r"\[[^\]]*\]", "x", ancora)))
+            if padrao[len(ancora):].startswith(".*?"):
+                self.restos[exame] = re.compile(padrao[len(ancora) + 3:], FLAGS_PADROES)
+            else:
+                self.restos[exame] = None
+        self.sobreposicao = max(maior_ancora - 1, 0)
+
+        alternativas = sorted({a.pattern for a in self.ancoras.values()}, key=len, reverse=True)
+        self.varredura = None
+        self.varredura_minuscula = None
+        if alternativas:
+            self.varredura = re.compile("|".join(alternativas), FLAGS_PADROES)
+            self.varredura_minuscula = re.compile("|".join(a.lower() for a in alternativas))
+
+    def ocorrencias(self, texto, desde=0, ate=None):
+        """Gera (início, fim, exame) de cada âncora que começa em [desde, ate), em ordem de posição"""
+        if not self.varredura:
+            return
+
+        ate = len(texto) if ate is None else ate
+        for inicio in range(desde, ate, self.BLOCO):
+            # O bloco avança sobre o seguinte o bastante para conter qualquer
+            # âncora que comece nele; só os inícios dentro do bloco contam
+            janela = texto[inicio:inicio + self.BLOCO + self.sobreposicao]
+            limite = min(self.BLOCO, len(janela), ate - inicio)
+
+            # Sem IGNORECASE o re consegue pular direto para os candidatos; só vale
+            # quando str.lower() preserva posições e equivalências do texto
+            minusculo = janela.lower()
+            if len(minusculo) == len(janela) and not any(c in janela for c in _CASEFOLD_ESPECIAL):
+                alvo, varredura, ancoras, iniciais = minusculo, self.varredura_minuscula, self.ancoras_minusculas, self.iniciais
+            else:
+                alvo, varredura, ancoras, iniciais = janela, self.varredura, self.ancoras, {}
+
+            # search a partir de p + 1 para também achar âncoras sobrepostas
+            match = varredura.search(alvo, 0, limite + self.sobreposicao)
+            while match and match.start() < limite:
+                p = match.start()
+                for exame, ancora in ancoras.items():
+                    inicial = iniciais.get(exame)
+                    if inicial is not None and alvo[p] not in inicial:
+                        continue
+                    encontrada = ancora.match(alvo, p)
+                    if encontrada:
+                        yield inicio + p, inicio + encontrada.end(), exame
+                match = varredura.search(alvo, p + 1)
+
+    def buscar(self, texto, exames=None):
+        """Retorna {exame: match ou None}; o grupo 1 é o mesmo de re.search com o padrão"""
+        exames = list(self.completos) if exames is None else list(exames)
+        matches = {exame: None for exame in exames}
+        pendentes = set()
+        for exame in exames:
+            if exame in self.ancoras:
+                pendentes.add(exame)
+            else:
+                matches[exame] = self.completos[exame].search(texto)
+
+        if not pendentes:
+            return matches
+        for p, fim, exame in self.ocorrencias(texto):
+            if exame not in pendentes:
+                continue
+            if self.restos[exame] is not None:
+                matches[exame] = self.restos[exame].search(texto, fim)
+                pendentes.discard(exame)
+            else:
+                match = self.completos[exame].match(texto, p)
+                if match:
+                    matches[exame] = match
+                    pendentes.discard(exame)
+            if not pendentes:
+                break
+        return matches
+
+class BuscaIncremental:
+    """
+    A busca de ScannerAnalitos.buscar sobre um texto que chega em pedaços
+    (páginas), sem reler o que já foi varrido.
+
+    As âncoras só são procuradas no trecho novo (mais a sobreposição de uma
+    âncora que atravessa a emenda). As posições de âncora cujo padrão ainda
+    não casou ficam guardadas e são testadas de novo a cada pedaço, já que o
+    valor pode estar no pedaço seguinte. O resultado é o mesmo de buscar()
+    sobre o texto acumulado.
+    """
+
+    def __init__(self, scanner, exames):
+        self.scanner = scanner
+        self.texto = None
+        self.matches = {exame: None for exame in exames}
+        self.pendentes = list(exames)
+        # Âncoras que começam antes disso já foram vistas
+        self._varrido = 0
+        # exame -> [(início, fim)] das âncoras vistas e ainda sem match
+        self._ancoras = {e: [] for e in exames if e in scanner.ancoras}
+
+    def acrescentar(self, pedaco):
+        self.texto = pedaco if self.texto is None else self.texto + "\n" + pedaco
+        # Âncora começando na sobreposição final pode continuar no próximo pedaço
+        self._avancar(max(self._varrido, len(self.texto) - self.scanner.sobreposicao))
+
+    def finalizar(self):
+        """Chamar quando não houver mais pedaços: considera as âncoras do fim do texto"""
+        if self.texto is not None:
+            self._avancar(len(self.texto))
+
+    def resolver(self, exame):
+        """Dá o exame por resolvido sem match (por exemplo, o cálcio total quando há iônico)"""
+        if exame in self.pendentes:
+            self.pendentes.remove(exame)
+
+    def _avancar(self, ate):
+        scanner = self.scanner
+        if ate > self._varrido:
+            for p, fim, exame in scanner.ocorrencias(self.texto, self._varrido, ate):
+                lista = self._ancoras.get(exame)
+                # Para "ÂNCORA.*?RESTO" só a primeira âncora importa
+                if lista is not None and exame in self.pendentes and not (lista and scanner.restos[exame]):
+                    lista.append((p, fim))
+            self._varrido = ate
+
+        for exame in list(self.pendentes):
+            if exame not in self._ancoras:
+                match = scanner.completos[exame].search(self.texto)
+            elif scanner.restos[exame] is not None:
+                ancoras = self._ancoras[exame]
+                match = scanner.restos[exame].search(self.texto, ancoras[0][1]) if ancoras else None
+            else:
+                match = next(
+                    (m for m in (scanner.completos[exame].match(self.texto, p) for p, _ in self._ancoras[exame]) if m),
+                    None,
+                )
+            if match:
+                self.matches[exame] = match
+                self.pendentes.remove(exame)
+                self._ancoras.pop(exame, None)
+
+@lru_cache(maxsize=8)
+def _scanner(padroes_itens):
+    return ScannerAnalitos(dict(padroes_itens))
+
+def obter_scanner(padroes):
+    """Scanner compilado para a tabela de padrões (compilado uma vez por tabela)"""
+    return _scanner(tuple(padroes.items()))
+
+def _para_numero(valor, exame):
+    """Converte o texto capturado ("1,2", "250.000") em float, ou None"""
+    if exame in ANALITOS_FLOAT64 and re.fullmatch(r"\d{1,3}(\.\d{3})+", valor):
+        valor = valor.replace(".", "")
+    valor = valor.replace(",", ".")
+    if valor.count(".") > 1:
+        inteiro, decimal = valor.rsplit(".", 1)
+        valor = inteiro.replace(".", "") + "." + decimal
+    try:
+        return float(valor)
+    except ValueError:
+        return None
+
+def _converter_valores(brutos, padroes):
+    resultados = {exame: _para_numero(brutos[exame], exame) if brutos.get(exame) else None for exame in padroes}
+
+    # Cálcio Total indica se o valor de Cálcio é o total (True) ou o iônico (False)
+    resultados["Cálcio Total"] = None
+    if resultados.get("Cálcio Iônico") is not None:
         resultados["Cálcio"] = resultados["Cálcio Iônico"]
-    elif resultados.get("Cálcio"):
-        resultados["Cálcio"] = resultados["Cálcio"] + " (t)"
+        resultados["Cálcio Total"] = False
+    elif resultados.get("Cálcio") is not None:
+        resultados["Cálcio Total"] = True
     resultados.pop("Cálcio Iônico", None)
     return resultados
 
-def extrair_exames_dos_pdfs(pasta):
+def extrair_valores(texto, padroes):
+    matches = obter_scanner(padroes).buscar(texto)
+    return _converter_valores({e: m.group(1) for e, m in matches.items() if m}, padroes)
+
+def extrair_valores_paginas(paginas, padroes):
+    """
+    Consome as páginas uma a uma e para assim que todos os analitos têm valor.
+
+    A busca é incremental (BuscaIncremental): cada página nova só é varrida
+    uma vez, e um valor pode estar na página seguinte à do nome do analito. Um
+    match achado nas primeiras páginas é o mesmo que seria achado no texto todo.
+    Retorna (valores, texto lido).
+    """
+    busca = BuscaIncremental(obter_scanner(padroes), list(padroes))
+    paginas = iter(paginas)
+    try:
+        for pagina in paginas:
+            busca.acrescentar(pagina)
+            # O cálcio iônico, quando existe, substitui o total
+            if busca.matches.get("Cálcio Iônico"):
+                busca.resolver("Cálcio")
+            if not busca.pendentes:
+                break
+        else:
+            busca.finalizar()
+    finally:
+        if hasattr(paginas, "close"):
+            paginas.close()
+    brutos = {exame: match.group(1) for exame, match in busca.matches.items() if match}
+    return _converter_valores(brutos, padroes), busca.texto or ""
+
+def _primeira_pagina(paginas, info):
+    """Repassa as páginas, guardando nome e data da amostra lidos da primeira"""
+    with closing(paginas):
+        for i, pagina in enumerate(paginas):
+            if i == 0:
+                info["Paciente"] = extrair_nome(pagina)
+                info["Data"] = extrair_data_amostra(pagina)
+            yield pagina
+
+def processar_pdf(filepath, paginado=True):
+    """
+    Extrai o registro de um PDF. Roda no processo principal ou num worker do pool.
+
+    No modo paginado as páginas são lidas sob demanda e a leitura para quando
+    todos os analitos foram encontrados; nome e data vêm da primeira página
+    (ou do texto lido, se não estiverem nela).
+    """
     padroes = definir_padroes()
-    registros = []
+    if not paginado:
+        texto = extrair_texto_pdf(filepath)
+        nome = extrair_nome(texto)
+        data = extrair_data_amostra(texto)
+        valores = extrair_valores(texto, padroes)
+        return {"Paciente": nome, "Data": data, **valores}
 
+    info = {}
+    valores, texto = extrair_valores_paginas(_primeira_pagina(iterar_paginas_pdf(filepath), info), padroes)
+    nome = info.get("Paciente")
+    if not nome or nome == "Paciente Desconhecido":
+        nome = extrair_nome(texto)
+    data = info.get("Data") or extrair_data_amostra(texto)
+    return {"Paciente": nome, "Data": data, **valores}
+
+def _processar_pdf_seguro(filepath, paginado=True):
+    try:
+        return processar_pdf(filepath, paginado), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def colunas_exames():
+    colunas = ["Paciente", "Data"]
+    for exame in definir_padroes():
+        if exame == "Cálcio Iônico":
+            continue
+        colunas.append(exame)
+        if exame == "Cálcio":
+            colunas.append("Cálcio Total")
+    return colunas
+
+def montar_dataframe(registros):
+    """
+    DataFrame tipado dos registros: Paciente categórico, Data datetime64,
+    analitos em float32 (float64 nos de ANALITOS_FLOAT64) e Cálcio Total booleano.
+    Registros do mesmo paciente e data/hora de amostra viram uma linha só.
+    """
+    df = pd.DataFrame(registros, columns=colunas_exames())
+    tipos = {"Paciente": "category", "Cálcio Total": "boolean"}
+    for exame in df.columns[2:]:
+        if exame != "Cálcio Total":
+            tipos[exame] = "float64" if exame in ANALITOS_FLOAT64 else "float32"
+    df = df.astype(tipos)
+    df["Data"] = pd.to_datetime(df["Data"])
+    return colapsar_duplicados(df)
+
+def _listar_pdfs(pasta):
+    return sorted(a for a in os.listdir(pasta) if a.lower().endswith(".pdf"))
+
+def _paciente_do_manifesto(registro, entrada):
+    """Sem nome no texto, usa o paciente que o robô pesquisou quando baixou o arquivo"""
+    if registro and entrada and entrada.get("paciente") and registro.get("Paciente") == "Paciente Desconhecido":
+        return {**registro, "Paciente": " ".join(str(entrada["paciente"]).split()).title()}
+    return registro
+
+def _processar_arquivos(pasta, arquivos, executor=None, usar_cache=True, paginado=True, vistos=None):
+    """
+    Gera (arquivo, registro, erro, duplicado_de) para cada arquivo, na ordem dada.
+
+    PDFs com o mesmo conteúdo de um já visto (nesta chamada ou no dict vistos,
+    hash -> arquivo) não são abertos: saem sem registro e com duplicado_de
+    apontando o arquivo original. Se a pasta tem manifesto do robô, o paciente
+    anotado no download cobre os PDFs cujo texto não trouxe o nome.
+    """
+    vistos = {} if vistos is None else vistos
+    manifesto = ler_manifesto(pasta)
+    resultados = {}
+    duplicados = {}
+
+    hashes = {}
+    for arquivo in arquivos:
+        try:
+            h = hash_arquivo(os.path.join(pasta, arquivo))
+        except OSError as e:
+            resultados[arquivo] = (None, f"{type(e).__name__}: {e}")
+            continue
+        if h in vistos:
+            duplicados[arquivo] = vistos[h]
+        else:
+            vistos[h] = arquivo
+            hashes[arquivo] = h
+
+    if usar_cache:
+        versao = versao_padroes()
+        try:
+            em_cache = CACHE.obter_varios(hashes.values(), versao)
+        except Exception as e:
+            print(f"Erro ao ler o cache de extração: {e}")
+            em_cache = {}
+        for arquivo, h in hashes.items():
+            if h in em_cache:
+                resultados[arquivo] = (em_cache[h], None)
+
+    pendentes = [a for a in hashes if a not in resultados]
+    caminhos = [os.path.join(pasta, a) for a in pendentes]
+
+    if executor and len(caminhos) > 1:
+        novos = executor.map(_processar_pdf_seguro, caminhos, [paginado] * len(caminhos))
+    else:
+        novos = (_processar_pdf_seguro(c, paginado) for c in caminhos)
+
+    for arquivo in arquivos:
+        if arquivo in duplicados:
+            yield arquivo, None, None, duplicados[arquivo]
+            continue
+        if arquivo in resultados:
+            registro, erro = resultados.pop(arquivo)
+        else:
+            registro, erro = next(novos)
+            if usar_cache and not erro:
+                try:
+                    CACHE.gravar_varios([(hashes[arquivo], registro)], versao)
+                except Exception as e:
+                    print(f"Erro ao gravar o cache de extração: {e}")
+        yield arquivo, _paciente_do_manifesto(registro, manifesto.get(arquivo)), erro, None
+
+def _aplicar_eviccao_cache():
+    try:
+        CACHE.aplicar_eviccao(versao_padroes())
+    except Exception as e:
+        print(f"Erro na evicção do cache de extração: {e}")
+
+def iter_exames(pasta, workers=1, usar_cache=True, paginado=True, falhas=None, progresso=None, duplicados=None):
+    """
+    Gera um registro por PDF da pasta, na ordem alfabética dos arquivos,
+    assim que cada um fica pronto.
+
+    Com workers > 1 os PDFs são processados num pool de processos. Com
+    usar_cache, PDFs já vistos (mesmo conteúdo e mesma versão dos padrões) vêm
+    do cache em disco sem serem abertos. Com paginado, cada PDF é lido página a
+    página até todos os analitos aparecerem. Registros sem data da amostra são
+    descartados. PDFs com conteúdo idêntico a outro da pasta são pulados sem
+    serem abertos e anexados à lista duplicados como (arquivo, original).
+    Arquivos que falharem são anexados à lista falhas como (arquivo, erro);
+    progresso, se passado, é chamado com (feitos, total).
+    """
     if not os.path.isdir(pasta):
-        return pd.DataFrame(columns=["Paciente", "Data"] +
-                             [k for k in padroes.keys() if k != "Cálcio Iônico"])
-
-    for arquivo in os.listdir(pasta):
-        if arquivo.lower().endswith(".pdf"):
-            try:
-                filepath = os.path.join(pasta, arquivo)
-                texto = extrair_texto_pdf(filepath)
-                nome = extrair_nome(texto)
-                data = extrair_data_amostra(texto)
-                valores = extrair_valores(texto, padroes)
-                registros.append({"Paciente": nome, "Data": data, **valores})
-            except Exception:
-                continue
+        return
+
+    arquivos = _listar_pdfs(pasta)
+    total = len(arquivos)
+    if usar_cache:
+        _aplicar_eviccao_cache()
+
+    executor = None
+    if workers > 1 and total > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, total))
+
+    try:
+        resultados = _processar_arquivos(pasta, arquivos, executor, usar_cache, paginado)
+        for feitos, (arquivo, registro, erro, duplicado_de) in enumerate(resultados, start=1):
+            if progresso:
+                progresso(feitos, total)
+
+            if duplicado_de:
+                if duplicados is not None:
+                    duplicados.append((arquivo, duplicado_de))
+            elif erro:
+                print(f"Erro ao processar {arquivo}: {erro}")
+                if falhas is not None:
+                    falhas.append((arquivo, erro))
+            elif registro.get("Data") is not None:
+                yield registro
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def _lotes_de_pdfs(pasta, tamanho_lote):
+    """Percorre a pasta com os.scandir, sem listar tudo, em lotes ordenados de nomes"""
+    lote = []
+    with os.scandir(pasta) as entradas:
+        for entrada in entradas:
+            if entrada.name.lower().endswith(".pdf") and entrada.is_file():
+                lote.append(entrada.name)
+                if len(lote) >= tamanho_lote():
+                    yield sorted(lote)
+                    lote = []
+    if lote:
+        yield sorted(lote)
+
+def _memoria_mb(executor=None):
+    """
+    Memória deste processo (RSS) e dos workers do executor, em MB. Dos workers
+    conta só a USS: as páginas herdadas do fork e ainda compartilhadas já estão
+    no RSS deste processo. Outros filhos (Chrome, chromedriver) ficam de fora.
+    """
+    total = psutil.Process().memory_info().rss
+    workers = getattr(executor, "_processes", None) or {}
+    for pid in list(workers):
+        try:
+            total += psutil.Process(pid).memory_full_info().uss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
 
-    colunas = ["Paciente", "Data"] + [k for k in padroes.keys() if k != "Cálcio Iônico"]
-    df = pd.DataFrame(registros, columns=colunas)
-    if "Data" in df.columns:
-        df = df[df["Data"].notna()]
+def extrair_exames_em_lotes(pasta, tamanho_lote=TAMANHO_LOTE_PADRAO, limite_memoria_mb=LIMITE_MEMORIA_MB,
+                            workers=1, usar_cache=True, paginado=True, progresso=None):
+    """
+    Extração para pastas muito grandes, com memória limitada.
+
+    Os PDFs são lidos em lotes de tamanho_lote e cada lote é gravado no armazém
+    local e descartado antes do próximo, então nada cresce com o tamanho da pasta.
+    Depois de cada lote a memória (processo + workers, ver _memoria_mb) é
+    medida: acima de limite_memoria_mb o lote é reduzido à metade e, se já for
+    1 e a memória continuar acima, a extração é interrompida. Retorna um relatório em dict;
+    progresso, se passado, é chamado com o relatório parcial depois de cada lote.
+    """
+    relatorio = {
+        "arquivos": 0,
+        "registros": 0,
+        "duplicados": 0,
+        "lotes": 0,
+        "falhas": [],
+        "tamanho_lote": tamanho_lote,
+        "pico_memoria_mb": _memoria_mb(),
+        "limite_memoria_mb": limite_memoria_mb,
+        "interrompido": False,
+    }
+    if not os.path.isdir(pasta):
+        return relatorio
+
+    if usar_cache:
+        _aplicar_eviccao_cache()
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    vistos = {}
+    try:
+        for lote in _lotes_de_pdfs(pasta, lambda: relatorio["tamanho_lote"]):
+            registros = []
+            resultados = _processar_arquivos(pasta, lote, executor, usar_cache, paginado, vistos)
+            for arquivo, registro, erro, duplicado_de in resultados:
+                if duplicado_de:
+                    relatorio["duplicados"] += 1
+                elif erro:
+                    print(f"Erro ao processar {arquivo}: {erro}")
+                    relatorio["falhas"].append((arquivo, erro))
+                elif registro.get("Data") is not None:
+                    registros.append(registro)
+
+            ARMAZEM.anexar(montar_dataframe(registros))
+            relatorio["arquivos"] += len(lote)
+            relatorio["registros"] += len(registros)
+            relatorio["lotes"] += 1
+            del registros
+            gc.collect()
+
+            memoria = _memoria_mb(executor)
+            relatorio["pico_memoria_mb"] = max(relatorio["pico_memoria_mb"], memoria)
+            if progresso:
+                progresso(relatorio)
+
+            if limite_memoria_mb and memoria > limite_memoria_mb:
+                if relatorio["tamanho_lote"] == 1:
+                    print(f"Extração interrompida: {memoria:.0f} MB acima do limite de {limite_memoria_mb} MB")
+                    relatorio["interrompido"] = True
+                    break
+                relatorio["tamanho_lote"] = max(1, relatorio["tamanho_lote"] // 2)
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return relatorio
+
+def _armazenar(df):
+    """Anexa ao armazém local; retorna False (e registra o erro) se a gravação falhar"""
+    try:
+        ARMAZEM.anexar(df)
+        return True
+    except Exception as e:
+        print(f"Erro ao gravar os exames no armazém local: {e}")
+        return False
+
+def extrair_exames_dos_pdfs(pasta, workers=1, usar_cache=True, paginado=True, armazenar=True):
+    """
+    Extrai os exames de todos os PDFs da pasta num DataFrame (ver iter_exames).
+
+    Arquivos que falharem ficam em df.attrs["falhas"] como lista de (arquivo, erro)
+    e PDFs repetidos em df.attrs["duplicados"] como (arquivo, original).
+    Com armazenar, os exames também são anexados ao armazém local (armazem.ARMAZEM).
+    """
+    falhas = []
+    duplicados = []
+    registros = list(iter_exames(pasta, workers, usar_cache, paginado, falhas, duplicados=duplicados))
+    df = montar_dataframe(registros)
+    if armazenar:
+        _armazenar(df)
+    df.attrs["falhas"] = falhas
+    df.attrs["duplicados"] = duplicados
+    return df
+
+def extrair_com_tabela_ao_vivo(pasta, workers=WORKERS_EXTRACAO):
+    """
+    Extrai os PDFs mostrando os registros na tabela à medida que ficam prontos.
+
+    A tabela ao vivo mostra os registros crus e é redesenhada no máximo a cada
+    INTERVALO_TABELA_AO_VIVO segundos; o DataFrame tipado (com duplicados
+    colapsados) é montado uma vez só, no fim.
+    """
+    contador = st.empty()
+    barra = st.progress(0)
+    tabela = st.empty()
+    colunas = colunas_exames()
+    registros = []
+    falhas = []
+    duplicados = []
+    ultimo_desenho = 0.0
+
+    def progresso(feitos, total):
+        contador.caption(f"📄 {feitos}/{total} PDFs processados · {len(registros)} exames")
+        barra.progress(feitos / total)
+
+    for registro in iter_exames(pasta, workers=workers, falhas=falhas, progresso=progresso, duplicados=duplicados):
+        registros.append(registro)
+        if time.monotonic() - ultimo_desenho >= INTERVALO_TABELA_AO_VIVO:
+            tabela.dataframe(pd.DataFrame(registros, columns=colunas), use_container_width=True)
+            ultimo_desenho = time.monotonic()
+
+    tabela.empty()
+    df = montar_dataframe(registros)
+    if not _armazenar(df):
+        st.warning("⚠️ Não foi possível gravar os exames no armazém local; o envio usará só esta extração.")
+    if duplicados:
+        st.caption(f"♻️ {len(duplicados)} PDF(s) repetido(s) ignorado(s) sem reprocessar.")
+    df.attrs["falhas"] = falhas
+    df.attrs["duplicados"] = duplicados
     return df
 
+def _avisar_falhas(falhas):
+    if falhas:
+        with st.expander(f"⚠️ {len(falhas)} PDF(s) não puderam ser lidos"):
+            for arquivo, erro in falhas:
+                st.write(f"**{arquivo}**: {erro}")
+
+def _guardar_na_sessao(df):
+    st.session_state["df_exames"] = df
+    st.session_state["indice_exames"] = IndiceTemporal(df)
+
 def executar_extrator_tabelado(pasta_manual=None):
     st.subheader("📊 Extração de exames")
 
     pasta_padrao = "/home/karolinewac/tablab_abc/pdfs_abc"
 
     if pasta_manual:
-        df = extrair_exames_dos_pdfs(pasta_manual)
+        df = extrair_com_tabela_ao_vivo(pasta_manual)
+        _avisar_falhas(df.attrs.get("falhas", []))
         if not df.empty:
-            st.session_state["df_exames"] = df
+            _guardar_na_sessao(df)
         return df
 
     subpastas = sorted([f.name for f in os.scandir(pasta_padrao) if f.is_dir()], reverse=True)
@@ -99,22 +741,50 @@ def executar_extrator_tabelado(pasta_manual=None):
         return
 
     escolha = st.selectbox("Escolha a subpasta com os PDFs:", subpastas)
+    em_lotes = st.checkbox(
+        "📦 Modo em lotes (pastas muito grandes)",
+        help=f"Processa {TAMANHO_LOTE_PADRAO} PDFs por vez, grava cada lote no armazém local "
+             f"e mantém a memória abaixo de {LIMITE_MEMORIA_MB} MB.",
+    )
 
-    if st.button("🔍 Processar PDFs dessa pasta"):
+    processar = st.button("🔍 Processar PDFs dessa pasta")
+    if processar and em_lotes:
         caminho_pdfs = os.path.join(pasta_padrao, escolha)
-        df = extrair_exames_dos_pdfs(caminho_pdfs)
+        status = st.empty()
+
+        def progresso(relatorio):
+            status.caption(
+                f"📦 Lote {relatorio['lotes']} · {relatorio['arquivos']} PDFs · "
+                f"{relatorio['registros']} exames · pico {relatorio['pico_memoria_mb']:.0f} MB"
+            )
+
+        relatorio = extrair_exames_em_lotes(caminho_pdfs, workers=WORKERS_EXTRACAO, progresso=progresso)
+        _avisar_falhas(relatorio["falhas"])
+        if relatorio["interrompido"]:
+            st.error(
+                f"❌ Extração interrompida: memória acima de {relatorio['limite_memoria_mb']} MB "
+                f"(pico {relatorio['pico_memoria_mb']:.0f} MB) após {relatorio['arquivos']} PDFs."
+            )
+        else:
+            st.success(
+                f"✅ {relatorio['registros']} exames de {relatorio['arquivos']} PDFs gravados no armazém "
+                f"em {relatorio['lotes']} lotes (pico de memória {relatorio['pico_memoria_mb']:.0f} MB, "
+                f"{relatorio['duplicados']} PDFs repetidos ignorados)."
+            )
+    elif processar:
+        caminho_pdfs = os.path.join(pasta_padrao, escolha)
+        df = extrair_com_tabela_ao_vivo(caminho_pdfs)
+        _avisar_falhas(df.attrs.get("falhas", []))
 
         if df.empty:
             st.warning("Nenhum exame foi extraído dos PDFs.")
             return
 
-        st.session_state["df_exames"] = df
+        _guardar_na_sessao(df)
         st.session_state["filtros_ativos"] = True
         st.success("✅ Extração concluída com sucesso.")
 
-    if "df_exames" in st.session_state:
-        df = st.session_state["df_exames"]
-
+    if "df_exames" in st.session_state or ARMAZEM.dias_disponiveis():
         st.markdown("---")
         st.markdown("### 🔍 Filtros")
 
@@ -125,15 +795,20 @@ def executar_extrator_tabelado(pasta_manual=None):
         data_ref = st.date_input("Escolha a data de referência para o filtro:", value=st.session_state["data_ref"])
         st.session_state["data_ref"] = data_ref
 
-        data_véspera = pd.to_datetime(data_ref - timedelta(days=1))
-        data_ref = pd.to_datetime(data_ref)
-
-        hora_corte = pd.to_timedelta("11:30:00")
-        filtro = (
-            (df["Data"].dt.normalize() == data_ref) |
-            ((df["Data"].dt.normalize() == data_véspera) & (df["Data"].dt.time >= (datetime.min + hora_corte).time()))
+        hora_corte = st.time_input(
+            "Incluir exames da véspera a partir de:",
+            value=datetime.strptime(HORA_CORTE_PADRAO, "%H:%M:%S").time(),
         )
-        df = df[filtro]
+
+        # O armazém guarda tudo que já foi extraído; só as partições da janela são lidas
+        df = ARMAZEM.ler_janela(data_ref, hora_corte)
+        if df is None:
+            # O índice da sessão é montado uma vez por extração, não a cada rerun
+            indice = st.session_state.get("indice_exames")
+            if indice is None:
+                indice = IndiceTemporal(st.session_state.get("df_exames", montar_dataframe([])))
+                st.session_state["indice_exames"] = indice
+            df = indice.janela(data_ref, hora_corte)
 
         nomes = sorted(df["Paciente"].dropna().unique())
         filtro_nome = st.multiselect("Filtrar por nome do paciente:", nomes)
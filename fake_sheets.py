@@ -0,0 +1,383 @@
+# fake_sheets.py - Servidor local que imita os endpoints da Sheets API usados pelo gspread, para medir e testar o envio sem a API real
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import gspread
+import requests
+
+HOSTS_GOOGLE = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
+# Datas da planilha são dias desde 30/12/1899
+_EPOCA = datetime(1899, 12, 30)
+_CELULA = re.compile(r"^([A-Za-z]*)(\d*)$")
+_DATA_TEXTO = re.compile(r"^\d{2}/\d{2}/\d{4}( \d{2}:\d{2}(:\d{2})?)?$")
+
+
+def _coluna_para_indice(letras):
+    indice = 0
+    for letra in letras.upper():
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+def _indice_para_coluna(indice):
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _separar_intervalo(intervalo):
+    """'05'!A1:B2 -> ("05", "A1:B2"); sem aba -> (None, intervalo)"""
+    if intervalo.startswith("'"):
+        fim = 1
+        while True:
+            fim = intervalo.index("'", fim)
+            if intervalo[fim + 1:fim + 2] == "'":
+                fim += 2
+                continue
+            break
+        titulo = intervalo[1:fim].replace("''", "'")
+        resto = intervalo[fim + 1:]
+        return titulo, resto[1:] if resto.startswith("!") else resto
+    if "!" in intervalo:
+        titulo, celulas = intervalo.rsplit("!", 1)
+        return titulo, celulas
+    return None, intervalo
+
+
+def _limites(celulas):
+    """A1:B2 -> (linha0, coluna0, linha1, coluna1), com None para extremos abertos (0-based, inclusivo)"""
+    if not celulas:
+        return 0, 0, None, None
+    inicio, _, fim = celulas.partition(":")
+    fim = fim or inicio
+    (c0, l0), (c1, l1) = (_CELULA.match(p).groups() for p in (inicio, fim))
+    return (
+        int(l0) - 1 if l0 else 0,
+        _coluna_para_indice(c0) if c0 else 0,
+        int(l1) - 1 if l1 else None,
+        _coluna_para_indice(c1) if c1 else None,
+    )
+
+
+def _interpretar(valor, opcao):
+    """Como a planilha guarda o valor: USER_ENTERED converte números e datas, RAW guarda o texto"""
+    if opcao != "USER_ENTERED" or not isinstance(valor, str):
+        return valor
+    texto = valor.strip()
+    if _DATA_TEXTO.match(texto):
+        for formato in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y"):
+            try:
+                return datetime.strptime(texto, formato)
+            except ValueError:
+                continue
+    try:
+        return float(texto.replace(",", ".")) if texto else ""
+    except ValueError:
+        return valor
+
+
+def _renderizar(valor, opcao_valor, opcao_data):
+    if isinstance(valor, datetime):
+        if opcao_valor == "UNFORMATTED_VALUE" and opcao_data != "FORMATTED_STRING":
+            return (valor - _EPOCA) / timedelta(days=1)
+        return valor.strftime("%d/%m/%Y %H:%M:%S")
+    if isinstance(valor, float) and opcao_valor != "UNFORMATTED_VALUE":
+        return f"{valor:g}"
+    return valor
+
+
+class PlanilhaFalsa:
+    def __init__(self, titulo, abas=()):
+        self.id = uuid.uuid4().hex
+        self.titulo = titulo
+        self.abas = {}
+        self._proximo_id = 0
+        for aba in abas:
+            self.adicionar_aba(aba)
+
+    @property
+    def url(self):
+        return f"https://docs.google.com/spreadsheets/d/{self.id}/edit"
+
+    def adicionar_aba(self, titulo, linhas=1000, colunas=26):
+        self.abas[titulo] = {
+            "sheetId": self._proximo_id,
+            "title": titulo,
+            "index": len(self.abas),
+            "sheetType": "GRID",
+            "gridProperties": {"rowCount": linhas, "columnCount": colunas},
+            "valores": [],
+        }
+        self._proximo_id += 1
+        return self.abas[titulo]
+
+    def _aba(self, titulo):
+        if titulo is None:
+            return next(iter(self.abas.values()))
+        if titulo not in self.abas:
+            raise KeyError(titulo)
+        return self.abas[titulo]
+
+    def ler(self, intervalo, opcao_valor="FORMATTED_VALUE", opcao_data="SERIAL_NUMBER"):
+        titulo, celulas = _separar_intervalo(intervalo)
+        aba = self._aba(titulo)
+        l0, c0, l1, c1 = _limites(celulas)
+        linhas = aba["valores"][l0:None if l1 is None else l1 + 1]
+        saida = []
+        for linha in linhas:
+            trecho = linha[c0:None if c1 is None else c1 + 1]
+            while trecho and trecho[-1] in ("", None):
+                trecho = trecho[:-1]
+            saida.append([_renderizar(v, opcao_valor, opcao_data) for v in trecho])
+        while saida and not saida[-1]:
+            saida.pop()
+        return aba["title"], saida
+
+    def escrever(self, intervalo, valores, opcao):
+        titulo, celulas = _separar_intervalo(intervalo)
+        aba = self._aba(titulo)
+        l0, c0, _, _ = _limites(celulas)
+        grade = aba["valores"]
+        colunas = 0
+        for i, linha in enumerate(valores):
+            while len(grade) <= l0 + i:
+                grade.append([])
+            destino = grade[l0 + i]
+            while len(destino) < c0 + len(linha):
+                destino.append("")
+            for j, valor in enumerate(linha):
+                destino[c0 + j] = _interpretar(valor, opcao)
+            colunas = max(colunas, len(linha))
+        fim = f"{_indice_para_coluna(c0 + max(colunas, 1) - 1)}{l0 + max(len(valores), 1)}"
+        atualizado = f"{gspread.utils.absolute_range_name(aba['title'])}!{_indice_para_coluna(c0)}{l0 + 1}:{fim}"
+        return {
+            "spreadsheetId": self.id,
+            "updatedRange": atualizado,
+            "updatedRows": len(valores),
+            "updatedColumns": colunas,
+            "updatedCells": sum(len(linha) for linha in valores),
+        }
+
+    def metadados(self):
+        return {
+            "spreadsheetId": self.id,
+            "properties": {"title": self.titulo, "locale": "pt_BR", "timeZone": "America/Sao_Paulo"},
+            "sheets": [
+                {"properties": {k: v for k, v in aba.items() if k != "valores"}}
+                for aba in self.abas.values()
+            ],
+            "spreadsheetUrl": self.url,
+        }
+
+
+class ServidorSheetsFalso:
+    """
+    Sheets API em memória num ThreadingHTTPServer local.
+
+    Cobre o que o gspread usa para abrir por URL, listar abas, ler (get,
+    get_all_values, batchGet) e gravar (update, values batchUpdate e
+    batchUpdate com addSheet). latencia (segundos) é somada a cada
+    requisição; probabilidade_429 e injetar_429(n) simulam cota excedida.
+    As contagens de chamadas e bytes ficam em estatisticas.
+    """
+
+    def __init__(self, latencia=0.0, probabilidade_429=0.0, semente=None):
+        self.latencia = latencia
+        self.probabilidade_429 = probabilidade_429
+        self.planilhas = {}
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self._forcar_429 = 0
+        self._servidor = None
+        self.zerar_estatisticas()
+
+    def zerar_estatisticas(self):
+        self.estatisticas = {"chamadas": {}, "bytes_enviados": 0, "bytes_recebidos": 0, "erros_429": 0}
+
+    def injetar_429(self, quantidade=1):
+        with self._lock:
+            self._forcar_429 += quantidade
+
+    def criar_planilha(self, titulo, abas=()):
+        planilha = PlanilhaFalsa(titulo, abas)
+        self.planilhas[planilha.id] = planilha
+        return planilha
+
+    @property
+    def url_base(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self):
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self):
+                tamanho = int(self.headers.get("Content-Length") or 0)
+                corpo = self.rfile.read(tamanho) if tamanho else b""
+                status, resposta = servidor._tratar(self.command, self.path, corpo)
+                dados = json.dumps(resposta).encode("utf-8")
+                with servidor._lock:
+                    servidor.estatisticas["bytes_recebidos"] += tamanho + len(self.path)
+                    servidor.estatisticas["bytes_enviados"] += len(dados)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            do_GET = do_POST = do_PUT = _responder
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name="sheets-falso", daemon=True).start()
+        return self
+
+    def parar(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def cliente(self):
+        """Cliente gspread cujas requisições vão para este servidor"""
+        return gspread.Client(None, session=SessaoSheetsFalsa(self.url_base))
+
+    def _contar(self, tipo):
+        with self._lock:
+            self.estatisticas["chamadas"][tipo] = self.estatisticas["chamadas"].get(tipo, 0) + 1
+
+    def _deve_dar_429(self):
+        with self._lock:
+            if self._forcar_429:
+                self._forcar_429 -= 1
+                return True
+        return self.probabilidade_429 and self._aleatorio.random() < self.probabilidade_429
+
+    def _tratar(self, metodo, caminho, corpo):
+        if self.latencia:
+            time.sleep(self.latencia)
+        partes = urlsplit(caminho)
+        params = parse_qs(partes.query)
+        rota = partes.path
+        if not rota.startswith("/v4/spreadsheets/"):
+            return 404, _erro(404, f"Rota não simulada: {rota}")
+
+        resto = rota[len("/v4/spreadsheets/"):]
+        id_planilha, _, sufixo = resto.partition("/")
+        id_planilha, _, acao = id_planilha.partition(":")
+        if sufixo.startswith("values/"):
+            self._contar(f"{metodo} values")
+        else:
+            self._contar(f"{metodo} {sufixo or acao or 'metadados'}")
+
+        if self._deve_dar_429():
+            with self._lock:
+                self.estatisticas["erros_429"] += 1
+            return 429, _erro(429, "Quota exceeded for quota metric 'Read requests'", "RESOURCE_EXHAUSTED")
+
+        planilha = self.planilhas.get(id_planilha)
+        if planilha is None:
+            return 404, _erro(404, "Requested entity was not found.", "NOT_FOUND")
+
+        dados = json.loads(corpo) if corpo else {}
+        opcao_valor = params.get("valueRenderOption", ["FORMATTED_VALUE"])[0]
+        opcao_data = params.get("dateTimeRenderOption", ["SERIAL_NUMBER"])[0]
+        try:
+            with self._lock:
+                if not sufixo and not acao and metodo == "GET":
+                    return 200, planilha.metadados()
+
+                if acao == "batchUpdate" and metodo == "POST":
+                    respostas = []
+                    for pedido in dados.get("requests", []):
+                        if "addSheet" in pedido:
+                            props = pedido["addSheet"].get("properties", {})
+                            aba = planilha.adicionar_aba(props.get("title", f"Sheet{len(planilha.abas) + 1}"))
+                            respostas.append({"addSheet": {"properties": {k: v for k, v in aba.items() if k != "valores"}}})
+                        else:
+                            respostas.append({})
+                    return 200, {"spreadsheetId": planilha.id, "replies": respostas}
+
+                if sufixo == "values:batchGet" and metodo == "GET":
+                    intervalos = []
+                    for intervalo in params.get("ranges", []):
+                        titulo, valores = planilha.ler(intervalo, opcao_valor, opcao_data)
+                        intervalos.append(_intervalo_valores(intervalo, titulo, valores))
+                    return 200, {"spreadsheetId": planilha.id, "valueRanges": intervalos}
+
+                if sufixo == "values:batchUpdate" and metodo == "POST":
+                    opcao = dados.get("valueInputOption", "RAW")
+                    respostas = [planilha.escrever(d["range"], d.get("values", []), opcao) for d in dados.get("data", [])]
+                    return 200, {
+                        "spreadsheetId": planilha.id,
+                        "totalUpdatedRows": sum(r["updatedRows"] for r in respostas),
+                        "totalUpdatedColumns": sum(r["updatedColumns"] for r in respostas),
+                        "totalUpdatedCells": sum(r["updatedCells"] for r in respostas),
+                        "totalUpdatedSheets": len({r["updatedRange"].rsplit("!", 1)[0] for r in respostas}),
+                        "responses": respostas,
+                    }
+
+                if sufixo.startswith("values/"):
+                    intervalo = unquote(sufixo[len("values/"):])
+                    if metodo == "GET":
+                        titulo, valores = planilha.ler(intervalo, opcao_valor, opcao_data)
+                        return 200, _intervalo_valores(intervalo, titulo, valores)
+                    if metodo == "PUT":
+                        opcao = params.get("valueInputOption", ["RAW"])[0]
+                        return 200, planilha.escrever(intervalo, dados.get("values", []), opcao)
+        except (KeyError, AttributeError, ValueError) as e:
+            return 400, _erro(400, f"Unable to parse range: {e}", "INVALID_ARGUMENT")
+
+        return 404, _erro(404, f"Rota não simulada: {metodo} {rota}")
+
+
+def _intervalo_valores(intervalo, titulo, valores):
+    _, celulas = _separar_intervalo(intervalo)
+    nome = gspread.utils.absolute_range_name(titulo)
+    resposta = {"range": f"{nome}!{celulas}" if celulas else nome, "majorDimension": "ROWS"}
+    if valores:
+        resposta["values"] = valores
+    return resposta
+
+
+def _erro(codigo, mensagem, status="NOT_FOUND"):
+    return {"error": {"code": codigo, "message": mensagem, "status": status}}
+
+
+class SessaoSheetsFalsa(requests.Session):
+    """requests.Session que manda as chamadas aos hosts do Google para o servidor local"""
+
+    def __init__(self, url_base):
+        super().__init__()
+        self.url_base = url_base
+
+    def request(self, method, url, *args, **kwargs):
+        for host in HOSTS_GOOGLE:
+            if url.startswith(host):
+                url = self.url_base + url[len(host):]
+                break
+        return super().request(method, url, *args, **kwargs)
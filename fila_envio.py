@@ -0,0 +1,234 @@
+# fila_envio.py - Fila persistente (SQLite) de envios ao Censo, esvaziada por uma thread em segundo plano
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from cache_extracao import DIRETORIO_DADOS
+from escrivao import COLUNAS_GOOGLE, enviar_preparados, invalidar_cache_sheets, preparar_exames
+from janela import HORA_CORTE_PADRAO
+
+CAMINHO_FILA = os.path.join(DIRETORIO_DADOS, "fila_envio.sqlite")
+
+# Linhas por lote (todas da mesma planilha)
+TAMANHO_LOTE_FILA = 500
+# Depois disso a linha fica como "falhou" e só volta com reenfileirar_falhas()
+MAX_TENTATIVAS_FILA = 8
+ESPERA_MAX_FILA = 300
+# Linhas enviadas são apagadas depois desse tempo
+DIAS_HISTORICO_FILA = 7
+
+PENDENTE = "pendente"
+EM_ENVIO = "em_envio"
+ENVIADO = "enviado"
+FALHOU = "falhou"
+
+
+class FilaEnvio:
+    """
+    Uma linha por exame a gravar numa planilha. O trabalhador pega os
+    pendentes de uma planilha por vez e manda todos numa chamada de
+    enviar_preparados; como o envio é idempotente (registro de envios +
+    conferência com a aba), um lote que falhou no meio é simplesmente
+    reenviado inteiro.
+    """
+
+    def __init__(self, caminho=CAMINHO_FILA):
+        self.caminho = caminho
+
+    @contextmanager
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS fila (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    registro TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    erro TEXT,
+                    criado_em REAL NOT NULL,
+                    proximo_em REAL NOT NULL,
+                    atualizado_em REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS fila_estado ON fila (estado, proximo_em)")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enfileirar(self, url, registros):
+        """Acrescenta os registros (dicts) para a planilha; retorna quantos entraram"""
+        agora = time.time()
+        linhas = [
+            (url, json.dumps(r, ensure_ascii=False), PENDENTE, agora, agora, agora)
+            for r in registros
+        ]
+        with self._conectar() as conn:
+            conn.executemany(
+                "INSERT INTO fila (url, registro, estado, criado_em, proximo_em, atualizado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                linhas,
+            )
+        return len(linhas)
+
+    def retomar(self):
+        """Devolve à fila o que estava em envio quando o processo parou"""
+        with self._conectar() as conn:
+            conn.execute("UPDATE fila SET estado = ? WHERE estado = ?", (PENDENTE, EM_ENVIO))
+            conn.execute(
+                "DELETE FROM fila WHERE estado = ? AND atualizado_em < ?",
+                (ENVIADO, time.time() - DIAS_HISTORICO_FILA * 86400),
+            )
+
+    def reservar_lote(self, tamanho=TAMANHO_LOTE_FILA):
+        """(url, [(id, registro)]) do pendente mais antigo já liberado, marcados como em envio; ou None"""
+        agora = time.time()
+        with self._conectar() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            linha = conn.execute(
+                "SELECT url FROM fila WHERE estado = ? AND proximo_em <= ? ORDER BY id LIMIT 1",
+                (PENDENTE, agora),
+            ).fetchone()
+            if linha is None:
+                return None
+            url = linha[0]
+            itens = conn.execute(
+                "SELECT id, registro FROM fila WHERE estado = ? AND proximo_em <= ? AND url = ? "
+                "ORDER BY id LIMIT ?",
+                (PENDENTE, agora, url, tamanho),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE fila SET estado = ?, atualizado_em = ? WHERE id = ?",
+                [(EM_ENVIO, agora, i) for i, _ in itens],
+            )
+        return url, [(i, json.loads(r)) for i, r in itens]
+
+    def concluir(self, ids):
+        agora = time.time()
+        with self._conectar() as conn:
+            conn.executemany(
+                "UPDATE fila SET estado = ?, erro = NULL, atualizado_em = ? WHERE id = ?",
+                [(ENVIADO, agora, i) for i in ids],
+            )
+
+    def adiar(self, ids, erro):
+        """Conta uma tentativa; volta a pendente com espera exponencial ou, no limite, marca como falhou"""
+        agora = time.time()
+        with self._conectar() as conn:
+            for i in ids:
+                (tentativas,) = conn.execute("SELECT tentativas FROM fila WHERE id = ?", (i,)).fetchone()
+                tentativas += 1
+                estado = FALHOU if tentativas >= MAX_TENTATIVAS_FILA else PENDENTE
+                espera = min(ESPERA_MAX_FILA, 5 * 2 ** tentativas)
+                conn.execute(
+                    "UPDATE fila SET estado = ?, tentativas = ?, erro = ?, proximo_em = ?, atualizado_em = ? "
+                    "WHERE id = ?",
+                    (estado, tentativas, erro, agora + espera, agora, i),
+                )
+
+    def reenfileirar_falhas(self):
+        with self._conectar() as conn:
+            return conn.execute(
+                "UPDATE fila SET estado = ?, tentativas = 0, proximo_em = ? WHERE estado = ?",
+                (PENDENTE, time.time(), FALHOU),
+            ).rowcount
+
+    def status(self):
+        """Contagem por estado e o último erro registrado"""
+        with self._conectar() as conn:
+            contagem = dict(conn.execute("SELECT estado, COUNT(*) FROM fila GROUP BY estado"))
+            ultimo_erro = conn.execute(
+                "SELECT erro FROM fila WHERE erro IS NOT NULL ORDER BY atualizado_em DESC LIMIT 1"
+            ).fetchone()
+        situacao = {estado: contagem.get(estado, 0) for estado in (PENDENTE, EM_ENVIO, ENVIADO, FALHOU)}
+        situacao["ultimo_erro"] = ultimo_erro[0] if ultimo_erro else None
+        return situacao
+
+
+FILA = FilaEnvio()
+
+_trabalhador = None
+_lock_trabalhador = threading.Lock()
+_acordar = threading.Event()
+
+
+def _processar_lote(fila, url, itens):
+    ids = [i for i, _ in itens]
+    df_grouped = pd.DataFrame([r for _, r in itens], columns=["Paciente"] + COLUNAS_GOOGLE)
+    relatorio = {}
+    try:
+        sucesso = enviar_preparados(df_grouped, url, relatorio=relatorio)
+    except Exception as e:
+        sucesso = False
+        relatorio["erro"] = str(e)
+
+    if sucesso:
+        fila.concluir(ids)
+        return
+    erro = relatorio.get("erro") or (
+        f"Falha ao gravar {', '.join(relatorio['falhas'])}" if relatorio.get("falhas") else "Falha ao enviar"
+    )
+    print(f"❌ Fila de envio: {url}: {erro}")
+    invalidar_cache_sheets(url)
+    fila.adiar(ids, erro)
+
+
+def _laco_trabalhador(fila):
+    while True:
+        try:
+            lote = fila.reservar_lote()
+        except Exception as e:
+            print(f"❌ Fila de envio: erro ao ler a fila: {e}")
+            lote = None
+        if lote is None:
+            _acordar.wait(timeout=5)
+            _acordar.clear()
+            continue
+        _processar_lote(fila, *lote)
+
+
+def iniciar_trabalhador(fila=FILA):
+    """Inicia (uma vez por processo) a thread que esvazia a fila; retoma o que ficou em envio"""
+    global _trabalhador
+    with _lock_trabalhador:
+        if _trabalhador is not None and _trabalhador.is_alive():
+            return _trabalhador
+        fila.retomar()
+        _trabalhador = threading.Thread(target=_laco_trabalhador, args=(fila,), name="fila-envio", daemon=True)
+        _trabalhador.start()
+        return _trabalhador
+
+
+def enfileirar_envio(df, urls, data_referencia=None, hora_corte=HORA_CORTE_PADRAO, fila=FILA):
+    """
+    Prepara os exames como enviar_para_google_sheets faria e os põe na fila de
+    cada planilha; retorna sem esperar o envio. Retorna quantas linhas entraram.
+    """
+    if isinstance(urls, str):
+        urls = [urls]
+    urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))
+    df_grouped = preparar_exames(df, data_referencia, hora_corte)
+    if df_grouped is None or df_grouped.empty or not urls:
+        return 0
+
+    registros = df_grouped[["Paciente"] + COLUNAS_GOOGLE].astype({"Paciente": str}).to_dict("records")
+    total = sum(fila.enfileirar(url, registros) for url in urls)
+    iniciar_trabalhador(fila)
+    _acordar.set()
+    return total
+
+
+def status_fila(fila=FILA):
+    return fila.status()
+
+
+__all__ = ["enfileirar_envio", "iniciar_trabalhador", "status_fila", "FILA"]
@@ -0,0 +1,166 @@
+# indice_laudos.py - Índice persistente (SQLite) dos laudos já baixados, para que cada execução baixe só os novos
+
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from cache_extracao import DIRETORIO_DADOS, hash_arquivo
+from nomes import tokens_nome
+
+CAMINHO_INDICE_LAUDOS = os.path.join(DIRETORIO_DADOS, "indice_laudos.sqlite")
+# Cópia de cada PDF, pelo hash do conteúdo; as pastas das execuções recebem links para cá
+DIRETORIO_LAUDOS = os.path.join(DIRETORIO_DADOS, "laudos")
+# Laudos com data de hoje ou de até tantos dias atrás podem ainda ganhar
+# analitos liberados depois: não entram no índice e são sempre baixados
+DIAS_LAUDO_RECENTE = 1
+
+_DATA_NA_LINHA = re.compile(r"\b(\d{2})/(\d{2})/(\d{4})\b")
+
+# Texto da linha da tabela de resultados em que está cada botão "Laudo Completo"
+_JS_TEXTO_DAS_LINHAS = r"""
+return arguments[0].map((botao) => {
+    const linha = botao.closest('tr') || botao.parentElement;
+    return linha ? linha.innerText : '';
+});
+"""
+
+
+def chave_paciente(paciente):
+    return " ".join(tokens_nome(paciente))
+
+
+def _data_da_linha(texto):
+    """Data mais recente escrita na linha (coleta, liberação...); None se não houver"""
+    datas = []
+    for dia, mes, ano in _DATA_NA_LINHA.findall(texto):
+        try:
+            datas.append(datetime(int(ano), int(mes), int(dia)).date())
+        except ValueError:
+            continue
+    return max(datas, default=None)
+
+
+def laudo_recente(texto, hoje=None):
+    """True se a linha não tem data ou tem data de até DIAS_LAUDO_RECENTE dias atrás"""
+    data = _data_da_linha(texto)
+    hoje = hoje or date.today()
+    return data is None or data >= hoje - timedelta(days=DIAS_LAUDO_RECENTE)
+
+
+def chaves_dos_laudos(driver, botoes):
+    """
+    Identificador de cada laudo da pesquisa: SHA-1 do texto da linha do botão
+    (exame, data, unidade...). Linhas de texto idêntico são distinguidas pela
+    ordem em que aparecem. Laudos recentes (ver laudo_recente) ficam com
+    chave None: não são reaproveitados nem guardados.
+    """
+    textos = driver.execute_script(_JS_TEXTO_DAS_LINHAS, list(botoes)) or []
+    chaves, repeticoes = [], {}
+    for texto in textos:
+        texto = " ".join(str(texto or "").split())
+        n = repeticoes.get(texto, 0)
+        repeticoes[texto] = n + 1
+        if not texto or laudo_recente(texto):
+            chaves.append(None)
+        else:
+            chaves.append(hashlib.sha1(f"{texto}#{n}".encode("utf-8")).hexdigest())
+    return chaves
+
+
+def vincular(origem, destino):
+    """Hard link de origem em destino; cópia quando o link não é possível (outro disco, sem suporte)"""
+    try:
+        os.link(origem, destino)
+    except FileExistsError:
+        raise
+    except OSError:
+        shutil.copy2(origem, destino)
+    return destino
+
+
+class IndiceLaudos:
+    """
+    Um registro por (paciente pesquisado, chave do laudo), apontando para a
+    cópia do PDF em DIRETORIO_LAUDOS. Entradas cuja cópia sumiu são tratadas
+    como não baixadas.
+    """
+
+    def __init__(self, caminho=CAMINHO_INDICE_LAUDOS, diretorio=DIRETORIO_LAUDOS):
+        self.caminho = caminho
+        self.diretorio = diretorio
+
+    @contextmanager
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS laudos (
+                    paciente TEXT NOT NULL,
+                    laudo TEXT NOT NULL,
+                    arquivo TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    baixado_em REAL NOT NULL,
+                    PRIMARY KEY (paciente, laudo)
+                )"""
+            )
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _caminho_copia(self, h):
+        return os.path.join(self.diretorio, f"{h}.pdf")
+
+    def conhecidos(self, paciente, chaves):
+        """{posição: (caminho da cópia, nome original)} dos laudos da lista já baixados antes"""
+        posicoes = {}
+        for i, chave in enumerate(chaves):
+            if chave:
+                posicoes.setdefault(chave, i)
+        if not posicoes:
+            return {}
+        marcadores = ",".join("?" * len(posicoes))
+        with self._conectar() as conn:
+            linhas = conn.execute(
+                f"SELECT laudo, arquivo, hash FROM laudos WHERE paciente = ? AND laudo IN ({marcadores})",
+                [chave_paciente(paciente), *posicoes],
+            ).fetchall()
+        encontrados = {}
+        for laudo, arquivo, h in linhas:
+            copia = self._caminho_copia(h)
+            if os.path.exists(copia):
+                encontrados[posicoes[laudo]] = (copia, arquivo)
+        return encontrados
+
+    def registrar(self, paciente, chave, caminho):
+        """Guarda uma cópia do PDF baixado (link quando possível) e anota o laudo como baixado"""
+        h = hash_arquivo(caminho)
+        copia = self._caminho_copia(h)
+        os.makedirs(self.diretorio, exist_ok=True)
+        if not os.path.exists(copia):
+            try:
+                vincular(caminho, copia)
+            except FileExistsError:
+                pass
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO laudos (paciente, laudo, arquivo, hash, baixado_em) VALUES (?, ?, ?, ?, ?)",
+                (chave_paciente(paciente), chave, os.path.basename(caminho), h, time.time()),
+            )
+
+    def esquecer(self, paciente=None):
+        """Apaga as entradas (de um paciente ou todas); as cópias em disco ficam"""
+        with self._conectar() as conn:
+            if paciente is None:
+                conn.execute("DELETE FROM laudos")
+            else:
+                conn.execute("DELETE FROM laudos WHERE paciente = ?", (chave_paciente(paciente),))
+
+
+INDICE_LAUDOS = IndiceLaudos()
@@ -0,0 +1,57 @@
+# janela.py - Janela de datas usada no filtro e no envio: dia de referência + véspera após a hora de corte
+
+from datetime import time as hora, timedelta
+
+import pandas as pd
+
+HORA_CORTE_PADRAO = "11:30:00"
+
+
+def _como_timedelta(hora_corte):
+    if isinstance(hora_corte, hora):
+        return timedelta(hours=hora_corte.hour, minutes=hora_corte.minute, seconds=hora_corte.second)
+    return pd.to_timedelta(hora_corte)
+
+
+def limites_janela(data_referencia, hora_corte=HORA_CORTE_PADRAO):
+    """Intervalo [início, fim) da janela: véspera a partir da hora de corte até o fim do dia de referência"""
+    data_ref = pd.Timestamp(data_referencia).normalize()
+    return data_ref - timedelta(days=1) + _como_timedelta(hora_corte), data_ref + timedelta(days=1)
+
+
+def dentro_da_janela(data, data_referencia, hora_corte=HORA_CORTE_PADRAO):
+    if data is None or pd.isna(data):
+        return False
+    inicio, fim = limites_janela(data_referencia, hora_corte)
+    return inicio <= pd.Timestamp(data) < fim
+
+
+class IndiceTemporal:
+    """
+    Exames ordenados pela data da amostra, com um DatetimeIndex para busca binária.
+
+    A ordenação é feita uma vez; cada consulta de janela custa O(log n) para
+    achar os limites e devolve uma fatia contígua.
+    """
+
+    def __init__(self, df):
+        df = df[df["Data"].notna()]
+        ordem = pd.to_datetime(df["Data"]).argsort(kind="stable")
+        self.df = df.iloc[ordem].reset_index(drop=True)
+        self.indice = pd.DatetimeIndex(self.df["Data"])
+
+    def __len__(self):
+        return len(self.df)
+
+    def entre(self, inicio, fim):
+        i = self.indice.searchsorted(pd.Timestamp(inicio), side="left")
+        j = self.indice.searchsorted(pd.Timestamp(fim), side="left")
+        return self.df.iloc[i:j]
+
+    def janela(self, data_referencia, hora_corte=HORA_CORTE_PADRAO):
+        return self.entre(*limites_janela(data_referencia, hora_corte))
+
+
+def filtrar_janela(df, data_referencia, hora_corte=HORA_CORTE_PADRAO):
+    """Atalho para consultas avulsas; para consultas repetidas, guarde o IndiceTemporal"""
+    return IndiceTemporal(df).janela(data_referencia, hora_corte)
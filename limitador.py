@@ -0,0 +1,89 @@
+# limitador.py - Limite de taxa (token bucket) com nova tentativa e backoff para chamadas à API do Google
+
+import random
+import threading
+import time
+
+import requests
+
+# Cota padrão da Sheets API por usuário: 60 requisições por minuto
+QUOTA_POR_MINUTO = 60
+
+STATUS_REPETIVEIS = {429, 500, 502, 503, 504}
+
+
+def deve_repetir(erro):
+    """True para cota excedida (429), erros 5xx e falhas de conexão"""
+    if isinstance(erro, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    resposta = getattr(erro, "response", None)
+    return getattr(resposta, "status_code", None) in STATUS_REPETIVEIS
+
+
+def _retry_after(erro):
+    resposta = getattr(erro, "response", None)
+    valor = getattr(resposta, "headers", {}).get("Retry-After") if resposta is not None else None
+    try:
+        return float(valor) if valor is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LimitadorTaxa:
+    """
+    Token bucket com capacidade de por_minuto requisições, reabastecido
+    continuamente. Uma rajada inicial pode usar a cota inteira; depois o ritmo
+    fica em por_minuto / 60 requisições por segundo.
+
+    executar() espera um token, faz a chamada e, em erro repetível, tenta de
+    novo com backoff exponencial e jitter (respeitando Retry-After, se vier).
+    Pode ser compartilhado entre threads.
+    """
+
+    def __init__(self, por_minuto=QUOTA_POR_MINUTO, max_tentativas=6, espera_base=1.0, espera_max=64.0):
+        self.capacidade = float(por_minuto)
+        self.taxa = por_minuto / 60.0
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self._tokens = self.capacidade
+        self._atualizado = time.monotonic()
+        self._lock = threading.Lock()
+        self.chamadas = 0
+        self.repeticoes = 0
+
+    def adquirir(self):
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa)
+                self._atualizado = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.chamadas += 1
+                    return
+                espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+    def _esvaziar(self):
+        # Após um 429 o servidor já considera a cota gasta; não adianta gastar os tokens locais
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0)
+            self._atualizado = time.monotonic()
+
+    def executar(self, funcao, *args, **kwargs):
+        for tentativa in range(self.max_tentativas):
+            self.adquirir()
+            try:
+                return funcao(*args, **kwargs)
+            except Exception as e:
+                if not deve_repetir(e) or tentativa == self.max_tentativas - 1:
+                    raise
+                if getattr(getattr(e, "response", None), "status_code", None) == 429:
+                    self._esvaziar()
+                espera = _retry_after(e)
+                if espera is None:
+                    espera = random.uniform(0, min(self.espera_max, self.espera_base * 2 ** tentativa))
+                self.repeticoes += 1
+                print(f"Tentativa {tentativa + 1} falhou ({e}); nova tentativa em {espera:.1f}s")
+                time.sleep(espera)
@@ -0,0 +1,59 @@
+# manifesto.py - Manifesto (JSON Lines) de uma pasta de downloads: qual paciente e qual laudo gerou cada arquivo
+
+import json
+import os
+import threading
+from datetime import datetime
+
+NOME_MANIFESTO = "manifesto_downloads.jsonl"
+
+_lock = threading.Lock()
+
+
+def caminho_manifesto(pasta):
+    return os.path.join(pasta, NOME_MANIFESTO)
+
+
+def registrar_download(pasta, arquivo, paciente, laudo, via, **extras):
+    """
+    Acrescenta uma linha ao manifesto da pasta. laudo é a posição do botão
+    "Laudo Completo" na pesquisa; via é "clique" ou "http".
+    """
+    registro = {
+        "arquivo": os.path.basename(arquivo),
+        "paciente": paciente,
+        "laudo": laudo,
+        "via": via,
+        "baixado_em": datetime.now().isoformat(timespec="seconds"),
+        **extras,
+    }
+    with _lock, open(caminho_manifesto(pasta), "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    return registro
+
+
+def ler_manifesto(pasta):
+    """{arquivo: registro} da pasta; vazio se não houver manifesto. A última linha de cada arquivo vale."""
+    registros = {}
+    try:
+        with open(caminho_manifesto(pasta), encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    continue
+                registros[registro.get("arquivo")] = registro
+    except FileNotFoundError:
+        pass
+    return registros
+
+
+def mover_registros(pasta_origem, pasta_destino, renomeados):
+    """Copia para o manifesto do destino as linhas da origem, com os nomes {antigo: novo} aplicados"""
+    registros = ler_manifesto(pasta_origem)
+    if not registros:
+        return
+    with _lock, open(caminho_manifesto(pasta_destino), "a", encoding="utf-8") as f:
+        for arquivo, registro in registros.items():
+            if arquivo in renomeados:
+                f.write(json.dumps({**registro, "arquivo": renomeados[arquivo]}, ensure_ascii=False) + "\n")
@@ -0,0 +1,182 @@
+# nomes.py - Índice de nomes de pacientes para casar o censo com os resultados extraídos, tolerando pequenas diferenças
+
+import re
+import unicodedata
+from collections import Counter
+
+# Abaixo disso o par não é aceito
+LIMIAR_SIMILARIDADE = 0.85
+# Se o segundo melhor candidato ficar a menos disso do primeiro, o nome é ambíguo
+MARGEM_AMBIGUIDADE = 0.05
+# Candidatos pontuados por consulta (os que mais compartilham trigramas)
+MAX_CANDIDATOS = 8
+
+# Partículas ignoradas na comparação ("Maria da Silva" = "Maria D Silva" = "Maria Silva")
+PARTICULAS = {"d", "da", "das", "de", "di", "do", "dos", "e"}
+
+
+def tokens_nome(nome):
+    """Tokens do nome sem acentos, em minúsculas, sem pontuação e sem partículas"""
+    texto = unicodedata.normalize("NFKD", str(nome)).encode("ASCII", "ignore").decode("ascii").lower()
+    return tuple(t for t in re.split(r"[^a-z0-9]+", texto) if t and t not in PARTICULAS)
+
+
+def _trigramas(tokens):
+    texto = f" {' '.join(tokens)} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _tokens_compativeis(a, b):
+    # Iniciais casam com o nome completo ("P" = "Pedro")
+    return a == b or (len(a) == 1 and b.startswith(a)) or (len(b) == 1 and a.startswith(b))
+
+
+def _subsequencia(curta, longa):
+    i = 0
+    for token in longa:
+        if i < len(curta) and _tokens_compativeis(curta[i], token):
+            i += 1
+    return i == len(curta)
+
+
+def similaridade(tokens_a, tokens_b, trigramas_a=None, trigramas_b=None):
+    """
+    Entre 0 e 1. Base: coeficiente de Dice dos trigramas. Quando um nome é o
+    outro sem alguns nomes do meio ou com iniciais (mesmo primeiro e último
+    nome, resto na ordem), o par vale pelo menos 0,9.
+    """
+    if not tokens_a or not tokens_b:
+        return 0.0
+    if tokens_a == tokens_b:
+        return 1.0
+    trigramas_a = trigramas_a if trigramas_a is not None else _trigramas(tokens_a)
+    trigramas_b = trigramas_b if trigramas_b is not None else _trigramas(tokens_b)
+    dice = 2 * len(trigramas_a & trigramas_b) / (len(trigramas_a) + len(trigramas_b))
+
+    curta, longa = sorted((tokens_a, tokens_b), key=len)
+    if (
+        len(curta) >= 2
+        and _tokens_compativeis(curta[0], longa[0])
+        and _tokens_compativeis(curta[-1], longa[-1])
+        and _subsequencia(curta, longa)
+    ):
+        # Abaixo de 1: igualdade só para nomes idênticos
+        return max(dice, min(0.99, 0.9 + 0.1 * len(curta) / len(longa)))
+    return dice
+
+
+class IndiceNomes:
+    """
+    Nomes indexados por trigramas. Uma consulta só pontua os poucos nomes que
+    mais compartilham trigramas com ela, em vez de comparar com todos.
+
+    Nomes com os mesmos tokens ("José Da Silva" e "Jose Silva") são o mesmo
+    paciente: entram uma vez só, pelo representante, e variantes guarda os
+    nomes originais de cada representante.
+    """
+
+    def __init__(self, nomes, limiar=LIMIAR_SIMILARIDADE, margem=MARGEM_AMBIGUIDADE):
+        self.limiar = limiar
+        self.margem = margem
+        self.nomes = []
+        self.variantes = {}
+        self._tokens = []
+        self._trigramas = []
+        self._exatos = {}
+        self._postagens = {}
+
+        grupos = {}
+        for nome in dict.fromkeys(n for n in nomes if n):
+            tokens = tokens_nome(nome)
+            if tokens:
+                grupos.setdefault(tokens, []).append(nome)
+
+        for tokens, grupo in grupos.items():
+            # Representante estável entre execuções, qualquer que seja a ordem dos resultados
+            representante = min(grupo)
+            i = len(self.nomes)
+            self.nomes.append(representante)
+            self.variantes[representante] = grupo
+            self._tokens.append(tokens)
+            trigramas = _trigramas(tokens)
+            self._trigramas.append(trigramas)
+            self._exatos[tokens] = i
+            for trigrama in trigramas:
+                self._postagens.setdefault(trigrama, []).append(i)
+
+    def candidatos(self, nome):
+        """Lista de (nome indexado, similaridade), do mais para o menos parecido"""
+        tokens = tokens_nome(nome)
+        if not tokens:
+            return []
+        exato = self._exatos.get(tokens)
+        if exato is not None:
+            return [(self.nomes[exato], 1.0)]
+
+        trigramas = _trigramas(tokens)
+        contagem = Counter()
+        for trigrama in trigramas:
+            contagem.update(self._postagens.get(trigrama, ()))
+
+        pontuados = [
+            (self.nomes[i], similaridade(tokens, self._tokens[i], trigramas, self._trigramas[i]))
+            for i, _ in contagem.most_common(MAX_CANDIDATOS)
+        ]
+        return sorted(pontuados, key=lambda par: par[1], reverse=True)
+
+    def buscar(self, nome):
+        """
+        (nome indexado, similaridade, candidatos). O nome vem None se nenhum
+        candidato atingir o limiar ou se o par for ambíguo.
+        """
+        candidatos = self.candidatos(nome)
+        aceitos = [c for c in candidatos if c[1] >= self.limiar]
+        if not aceitos:
+            return None, (candidatos[0][1] if candidatos else 0.0), candidatos
+        if len(aceitos) > 1 and aceitos[0][1] - aceitos[1][1] < self.margem:
+            return None, aceitos[0][1], aceitos
+        return aceitos[0][0], aceitos[0][1], candidatos
+
+    def resolver(self, nomes_por_chave):
+        """
+        Casa os nomes de {chave: nome} (por exemplo leito -> paciente do censo)
+        com os nomes indexados, um para um.
+
+        Cada nome indexado vai para no máximo uma chave. Se várias chaves o
+        disputam, a única com correspondência exata fica com ele; sem uma
+        exata (ou com mais de uma), nenhuma fica.
+
+        Retorna (pares, ambiguos): pares é {chave: nome indexado} e ambiguos é
+        uma lista de (chave, nome, candidatos aceitos) que ficaram de fora por
+        empate entre candidatos ou por disputa com outra chave.
+        """
+        escolhas = {}
+        ambiguos = []
+        for chave, nome in nomes_por_chave.items():
+            encontrado, pontuacao, candidatos = self.buscar(nome)
+            aceitos = [c for c in candidatos if c[1] >= self.limiar]
+            if encontrado is not None:
+                escolhas[chave] = (encontrado, pontuacao, aceitos)
+            elif len(aceitos) > 1:
+                ambiguos.append((chave, nome, aceitos))
+
+        disputas = {}
+        for chave, (encontrado, pontuacao, _) in escolhas.items():
+            disputas.setdefault(encontrado, []).append((chave, pontuacao))
+
+        pares = {}
+        for encontrado, chaves in disputas.items():
+            exatas = [chave for chave, pontuacao in chaves if pontuacao >= 1.0]
+            if len(chaves) == 1:
+                vencedora = chaves[0][0]
+            else:
+                vencedora = exatas[0] if len(exatas) == 1 else None
+            for chave, _ in chaves:
+                if chave == vencedora:
+                    pares[chave] = encontrado
+                else:
+                    ambiguos.append((chave, nomes_por_chave[chave], escolhas[chave][2]))
+
+        ordem = {chave: i for i, chave in enumerate(nomes_por_chave)}
+        ambiguos.sort(key=lambda item: ordem[item[0]])
+        return dict(sorted(pares.items(), key=lambda par: ordem[par[0]])), ambiguos
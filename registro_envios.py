@@ -0,0 +1,68 @@
+# registro_envios.py - Registro local (SQLite) das linhas já gravadas no Censo, para reenvios não duplicarem linhas
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from cache_extracao import DIRETORIO_DADOS
+
+
+class RegistroEnvios:
+    """
+    Uma linha por exame gravado, identificada por (planilha, aba, paciente,
+    data/hora da amostra). O paciente entra na chave porque a aba de um leito
+    passa a outro paciente quando o leito vaga.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    @contextmanager
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS envios (
+                    planilha TEXT NOT NULL,
+                    aba TEXT NOT NULL,
+                    paciente TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    enviado_em REAL NOT NULL,
+                    PRIMARY KEY (planilha, aba, paciente, data)
+                )"""
+            )
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enviados(self, planilha):
+        """Conjunto de (aba, paciente, data) já gravados nesta planilha"""
+        with self._conectar() as conn:
+            return set(
+                conn.execute("SELECT aba, paciente, data FROM envios WHERE planilha = ?", (planilha,))
+            )
+
+    def registrar(self, planilha, itens):
+        """Registra uma lista de (aba, paciente, data) gravados com sucesso"""
+        if not itens:
+            return
+        agora = time.time()
+        with self._conectar() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO envios VALUES (?, ?, ?, ?, ?)",
+                [(planilha, aba, paciente, data, agora) for aba, paciente, data in itens],
+            )
+
+    def esquecer(self, planilha=None):
+        """Apaga o registro de uma planilha, ou de todas"""
+        with self._conectar() as conn:
+            if planilha is None:
+                conn.execute("DELETE FROM envios")
+            else:
+                conn.execute("DELETE FROM envios WHERE planilha = ?", (planilha,))
+
+
+REGISTRO_ENVIOS = RegistroEnvios(os.path.join(DIRETORIO_DADOS, "registro_envios.sqlite"))
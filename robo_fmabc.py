@@ -24,26 +24,105 @@ import atexit
 import signal
 import uuid
 import logging
+import queue
+from contextlib import contextmanager
 import psutil
 import random
 
-# Limpar diretórios temporários antigos na inicialização
+from download_http import baixar_laudos, copiar_cookies, criar_sessao_http, destino_unico, urls_dos_laudos
+from indice_laudos import INDICE_LAUDOS, chaves_dos_laudos, vincular
+from manifesto import NOME_MANIFESTO, mover_registros, registrar_download
+from vigia_pasta import VigiaPasta
+
+# Perfis do Chrome: chrome_session_{id}_{segundos}_{microssegundos}_{pid do dono}_{aleatório}
+PREFIXO_PERFIL = "chrome_session_"
+
+
+def _pid_dono_perfil(nome):
+    """PID do processo Python que criou o perfil, tirado do nome do diretório; None se não der"""
+    try:
+        return int(nome.split("_")[-2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _perfil_orfao(nome):
+    pid = _pid_dono_perfil(nome)
+    return pid is None or not psutil.pid_exists(pid)
+
+
+def _processos_por_perfil():
+    """{diretório do perfil: [processos]} dos Chrome iniciados com --user-data-dir num perfil nosso"""
+    marca = f"--user-data-dir={os.path.join(tempfile.gettempdir(), PREFIXO_PERFIL)}"
+    por_perfil = {}
+    for proc in psutil.process_iter(['cmdline']):
+        try:
+            for arg in proc.info['cmdline'] or []:
+                if arg.startswith(marca):
+                    por_perfil.setdefault(arg.split("=", 1)[1], []).append(proc)
+                    break
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return por_perfil
+
+
+def encerrar_processos(processos, espera=3):
+    """SIGTERM nos processos, espera e SIGKILL no que sobrar"""
+    vivos = []
+    for proc in processos:
+        try:
+            proc.terminate()
+            vivos.append(proc)
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.AccessDenied as e:
+            logger.warning(f"⚠️ Sem permissão para encerrar o processo {proc.pid}: {e}")
+    _, restantes = psutil.wait_procs(vivos, timeout=espera)
+    for proc in restantes:
+        try:
+            proc.kill()
+        except psutil.Error:
+            pass
+    return len(vivos)
+
+
 def cleanup_old_temp_dirs():
+    """
+    Recolhe o que sobrou de execuções que morreram: perfis chrome_session_*
+    cujo processo dono não existe mais e os Chrome/chromedriver que ainda os
+    usam. Perfis de processos vivos (outra execução na mesma máquina) ficam.
+    """
     temp_base = tempfile.gettempdir()
+    try:
+        por_perfil = _processos_por_perfil()
+    except Exception as e:
+        logger.warning(f"⚠️ Erro ao listar processos do Chrome: {e}")
+        por_perfil = {}
+
     for item in os.listdir(temp_base):
-        if item.startswith('chrome_session_'):
-            path = os.path.join(temp_base, item)
+        if not item.startswith(PREFIXO_PERFIL) or not _perfil_orfao(item):
+            continue
+        path = os.path.join(temp_base, item)
+        processos = list(por_perfil.get(path, []))
+        # O chromedriver órfão não tem o perfil na linha de comando; é o pai do Chrome
+        for proc in list(processos):
             try:
-                shutil.rmtree(path, ignore_errors=True)
-            except:
+                pai = proc.parent()
+                if pai is not None and "chromedriver" in pai.name().lower() and pai not in processos:
+                    processos.append(pai)
+            except psutil.Error:
                 pass
-
-cleanup_old_temp_dirs()
+        if processos:
+            logger.info(f"🧹 Encerrando {len(processos)} processos órfãos do perfil {item}")
+            encerrar_processos(processos)
+        shutil.rmtree(path, ignore_errors=True)
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+cleanup_old_temp_dirs()
+
 class ChromeManager:
     """Gerenciador do Chrome otimizado para Google Cloud Platform"""
     
@@ -52,14 +131,16 @@ class ChromeManager:
         self.temp_dir = None
         self.download_path = download_path
         self.headless = headless
+        # chromedriver desta sessão; ele e seus descendentes são os únicos processos que encerramos
+        self.processo_driver = None
         self.session_id = f"{uuid.uuid4().hex}_{int(time.time())}"
         self._setup_cleanup()
     
     def _setup_cleanup(self):
         """Configura limpeza automática"""
         def cleanup():
-            self._cleanup_temp_dir()
             self._kill_chrome_processes()
+            self._cleanup_temp_dir()
             logger.info("🧼 Cleanup automático executado")
 
         atexit.register(cleanup)
@@ -71,44 +152,6 @@ class ChromeManager:
             except Exception as e:
                 logger.warning(f"⚠️ Falha ao registrar signal handler: {e}")
     
-    def _force_kill_chrome_processes(self):
-        """Mata todos os processos Chrome de forma agressiva"""
-        try:
-            # Listar processos Chrome
-            chrome_processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if proc.info['name'] and any(x in proc.info['name'].lower() for x in ['chrome', 'chromium', 'chromedriver']):
-                        chrome_processes.append(proc.info['pid'])
-                    elif proc.info['cmdline'] and any('chrome' in str(cmd).lower() for cmd in proc.info['cmdline']):
-                        chrome_processes.append(proc.info['pid'])
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            
-            # Matar processos encontrados
-            for pid in chrome_processes:
-                try:
-                    proc = psutil.Process(pid)
-                    proc.terminate()
-                    proc.wait(timeout=3)
-                except (psutil.NoSuchProcess, psutil.TimeoutExpired):
-                    try:
-                        proc.kill()
-                    except psutil.NoSuchProcess:
-                        pass
-                except Exception:
-                    pass
-            
-            # Backup com comandos do sistema
-            subprocess.run(['pkill', '-9', '-f', 'chrome'], check=False, capture_output=True, timeout=3)
-            subprocess.run(['pkill', '-9', '-f', 'chromium'], check=False, capture_output=True, timeout=3)
-            subprocess.run(['pkill', '-9', '-f', 'chromedriver'], check=False, capture_output=True, timeout=3)
-            
-            logger.info("🧹 Todos os processos Chrome foram terminados")
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Erro ao matar processos Chrome: {e}")
-    
     def _cleanup_temp_dir(self):
         """Limpa diretório temporário de forma robusta"""
         if self.temp_dir and os.path.exists(self.temp_dir):
@@ -129,10 +172,42 @@ class ChromeManager:
                 except:
                     pass
     
+    def _processos_da_sessao(self):
+        """
+        chromedriver desta sessão, seus descendentes e o resto do seu grupo de
+        processos, mais qualquer Chrome que ainda use o perfil da sessão
+        (os que ficaram órfãos quando o chromedriver saiu)
+        """
+        processos = {}
+        raiz = self.processo_driver
+        if raiz is not None and raiz.is_running():
+            try:
+                for proc in [raiz] + raiz.children(recursive=True):
+                    processos[proc.pid] = proc
+                grupo = os.getpgid(raiz.pid)
+                if grupo == raiz.pid:
+                    for proc in psutil.process_iter():
+                        try:
+                            if os.getpgid(proc.pid) == grupo:
+                                processos.setdefault(proc.pid, proc)
+                        except (OSError, psutil.Error):
+                            continue
+            except (OSError, psutil.Error):
+                pass
+        if self.temp_dir:
+            for proc in _processos_por_perfil().get(self.temp_dir, []):
+                processos.setdefault(proc.pid, proc)
+        return list(processos.values())
+
     def _kill_chrome_processes(self):
-        """Mata processos Chrome órfãos de forma inteligente"""
-        self._force_kill_chrome_processes()
-        time.sleep(2)  # Aguarda processos terminarem
+        """Encerra só os processos desta sessão; outras execuções na máquina não são tocadas"""
+        try:
+            encerrados = encerrar_processos(self._processos_da_sessao())
+            if encerrados:
+                logger.info(f"🧹 {encerrados} processos da sessão {self.session_id} encerrados")
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao encerrar processos da sessão: {e}")
+        self.processo_driver = None
     
     def _create_unique_temp_dir(self):
         """Cria diretório temporário completamente único"""
@@ -286,10 +361,6 @@ class ChromeManager:
             try:
                 logger.info(f"🚀 Tentativa {attempt + 1}/{max_attempts} de iniciar Chrome")
                 
-                # Limpeza agressiva antes de cada tentativa
-                self._kill_chrome_processes()
-                time.sleep(3)
-                
                 # Criar opções
                 options = self._create_chrome_options()
                 
@@ -299,12 +370,13 @@ class ChromeManager:
                 
                 chromedriver_path = self._find_chromedriver()
                 
-                # Configurar serviço
-                service = Service(chromedriver_path)
-                service.start()
+                # Serviço em sessão própria: o chromedriver e o Chrome formam um grupo só desta execução.
+                # webdriver.Chrome inicia o serviço (um start() antes deixaria um chromedriver sobrando)
+                service = Service(chromedriver_path, popen_kw={"start_new_session": True})
                 
                 # Criar driver
                 self.driver = webdriver.Chrome(service=service, options=options)
+                self.processo_driver = psutil.Process(service.process.pid)
                 
                 # Configurações de timeout
                 self.driver.implicitly_wait(10)
@@ -332,8 +404,8 @@ class ChromeManager:
                         pass
                     self.driver = None
                 
-                self._cleanup_temp_dir()
                 self._kill_chrome_processes()
+                self._cleanup_temp_dir()
                 
                 if attempt < max_attempts - 1:
                     wait_time = (attempt + 1) * 5
@@ -348,77 +420,91 @@ class ChromeManager:
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager - saída"""
+        self.encerrar()
+
+    def encerrar(self):
+        """Fecha o driver e limpa o diretório temporário"""
         if self.driver:
             try:
                 self.driver.quit()
                 logger.info("✅ Driver Chrome fechado")
             except Exception as e:
                 logger.warning(f"⚠️ Erro ao fechar driver: {e}")
-        
-        time.sleep(3)
-        self._cleanup_temp_dir()
+            self.driver = None
+
         self._kill_chrome_processes()
+        self._cleanup_temp_dir()
 
 
 class DownloadMonitor:
-    """Monitor de downloads otimizado"""
+    """
+    Aguarda os downloads pelos avisos do sistema de arquivos (VigiaPasta) e
+    anota no manifesto da pasta qual paciente e qual botão gerou cada arquivo.
+    """
     def __init__(self, pasta_download):
         self.pasta_download = pasta_download
-        self.arquivos_iniciais = set()
-        self.reset()
-    
+        os.makedirs(pasta_download, exist_ok=True)
+        self.vigia = VigiaPasta(pasta_download)
+        self.registrados = set()
+        # Último clique que estourou o tempo: um arquivo que chegue depois é dele
+        self.atrasado = None
+
+    def _novos(self, timeout):
+        return [
+            nome for nome in self.vigia.aguardar(timeout)
+            if nome != NOME_MANIFESTO and nome not in self.registrados
+        ]
+
     def reset(self):
-        """Reseta o estado do monitor"""
+        """Descarta avisos pendentes antes de um novo clique, atribuindo-os ao clique que estourou o tempo"""
         try:
-            if os.path.exists(self.pasta_download):
-                self.arquivos_iniciais = set(os.listdir(self.pasta_download))
-            else:
-                os.makedirs(self.pasta_download, exist_ok=True)
-                self.arquivos_iniciais = set()
+            for nome in self._novos(0):
+                if self.atrasado is not None:
+                    paciente, indice = self.atrasado
+                    self.registrar(paciente, indice, nome, "clique", atrasado=True)
+                    self.atrasado = None
+                else:
+                    logger.warning(f"⚠️ Arquivo sem clique correspondente: {nome}")
+                    self.registrados.add(nome)
         except Exception as e:
             logger.warning(f"⚠️ Erro ao resetar monitor: {e}")
-            self.arquivos_iniciais = set()
-    
-    def aguardar_download(self, timeout=20):
-        """Aguarda download com verificação otimizada"""
-        inicio = time.time()
-        
-        while time.time() - inicio < timeout:
-            try:
-                if not os.path.exists(self.pasta_download):
-                    time.sleep(0.5)
-                    continue
-                    
-                arquivos_atuais = set(os.listdir(self.pasta_download))
-                
-                # Verifica arquivos temporários
-                arquivos_temp = [f for f in arquivos_atuais if f.endswith(('.crdownload', '.tmp', '.part'))]
-                
-                # Se há novos arquivos e não há temporários, download completo
-                novos_arquivos = arquivos_atuais - self.arquivos_iniciais
-                if novos_arquivos and not arquivos_temp:
-                    time.sleep(1)  # Aguarda estabilização
-                    return True
-                
-                # Se há arquivos temporários, aguarda eles sumirem
-                if arquivos_temp:
-                    time.sleep(0.5)
-                else:
-                    time.sleep(1)
-                    
-            except Exception as e:
-                logger.warning(f"⚠️ Erro no monitor: {e}")
-                time.sleep(0.5)
-        
-        # Verifica uma última vez se houve sucesso
+        self.atrasado = None
+
+    def aguardar_download(self, timeout=20, paciente=None, indice=None):
+        """
+        Caminho do arquivo concluído depois do clique, ou None no timeout.
+        Com paciente e indice, o arquivo já sai registrado no manifesto.
+        """
+        limite = time.monotonic() + timeout
         try:
-            if os.path.exists(self.pasta_download):
-                arquivos_finais = set(os.listdir(self.pasta_download))
-                return len(arquivos_finais) > len(self.arquivos_iniciais)
-        except:
-            pass
-        
-        return False
+            while True:
+                novos = self._novos(max(0.0, limite - time.monotonic()))
+                if novos:
+                    caminho = os.path.join(self.pasta_download, novos[0])
+                    if paciente is not None:
+                        self.registrar(paciente, indice, caminho, "clique")
+                    return caminho
+                if time.monotonic() >= limite:
+                    break
+        except Exception as e:
+            logger.warning(f"⚠️ Erro no monitor: {e}")
+        if paciente is not None:
+            self.atrasado = (paciente, indice)
+        return None
+
+    def registrar(self, paciente, indice, caminho, via, **extras):
+        nome = os.path.basename(caminho)
+        self.registrados.add(nome)
+        registrar_download(self.pasta_download, nome, paciente, indice, via, **extras)
+
+    def fechar(self):
+        self.vigia.fechar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fechar()
 
 
 def verificar_driver_ativo(driver):
@@ -460,17 +546,404 @@ def fechar_abas_extras_rapido(driver, aba_principal):
         logger.warning(f"⚠️ Erro ao fechar abas: {e}")
 
 
-def processar_downloads_paciente(driver, botoes, paciente, monitor, aba_principal):
-    """Processa downloads de um paciente de forma otimizada"""
+URL_MATRIXNET = "http://laboratorio.fmabc.br/matrixnet/wfrmBlank.aspx"
+
+# Sessões do pool: quantas manter abertas, quantas execuções cada uma atende
+# antes de ser recriada, e após quanto tempo ociosa o login é refeito
+TAMANHO_POOL_CHROME = 1
+MAX_USOS_SESSAO = 20
+MAX_OCIOSO_SESSAO = 10 * 60
+
+# Sessões usadas no modo de download em paralelo
+SESSOES_PARALELAS_PADRAO = 3
+MAX_SESSOES_PARALELAS = 6
+
+
+def fazer_login(driver):
+    """Abre o MatrixNet e faz login"""
+    driver.get(URL_MATRIXNET)
+    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.NAME, "userLogin")))
+    driver.find_element(By.NAME, "userLogin").send_keys("HOAN")
+    driver.find_element(By.NAME, "userPassword").send_keys("5438")
+    driver.find_element(By.ID, "btnEntrar").click()
+    time.sleep(3)
+
+
+def navegar_para_exames(driver):
+    """Do menu inicial até a tela de pesquisa de exames"""
+    element = WebDriverWait(driver, 15).until(
+        EC.element_to_be_clickable((By.ID, "97-0B-E6-B7-F9-16-53-7C-C6-2C-E0-37-D0-67-F7-9E"))
+    )
+    driver.execute_script("arguments[0].click();", element)
+    time.sleep(2)
+
+    second_element = WebDriverWait(driver, 15).until(
+        EC.element_to_be_clickable((By.ID, "A1-2C-C6-AF-7F-6B-2B-3E-D5-00-73-F2-37-A1-D6-25"))
+    )
+    driver.execute_script("arguments[0].click();", second_element)
+    time.sleep(2)
+
+
+def definir_pasta_download(driver, pasta):
+    """Muda a pasta de download de um Chrome já aberto (via CDP)"""
+    os.makedirs(pasta, exist_ok=True)
+    for comando in ("Browser.setDownloadBehavior", "Page.setDownloadBehavior"):
+        try:
+            driver.execute_cdp_cmd(comando, {"behavior": "allow", "downloadPath": pasta})
+            return
+        except Exception as e:
+            erro = e
+    raise erro
+
+
+def tela_de_pesquisa_aberta(driver):
+    """True se o campo de pesquisa de pacientes está na página (sem esperar o implicit wait)"""
+    try:
+        driver.implicitly_wait(0)
+        return bool(driver.find_elements(By.ID, "textoDigitado"))
+    except WebDriverException:
+        return False
+    finally:
+        try:
+            driver.implicitly_wait(10)
+        except WebDriverException:
+            pass
+
+
+class SessaoChrome:
+    """Um Chrome do pool, já logado e na tela de pesquisa"""
+
+    def __init__(self, headless):
+        self.manager = ChromeManager(
+            download_path=tempfile.mkdtemp(prefix="tablab_downloads_"),
+            headless=headless,
+        )
+        self.driver = self.manager.start_driver()
+        self.usos = 0
+        self.aba_principal = None
+        self.autenticar()
+
+    def autenticar(self):
+        fazer_login(self.driver)
+        navegar_para_exames(self.driver)
+        self.ultimo_uso = time.time()
+
+    def saudavel(self):
+        return verificar_driver_ativo(self.driver) and tela_de_pesquisa_aberta(self.driver)
+
+    def preparar(self):
+        """Garante login válido e tela de pesquisa; refaz o login se a sessão ficou ociosa demais"""
+        if time.time() - self.ultimo_uso > MAX_OCIOSO_SESSAO or not tela_de_pesquisa_aberta(self.driver):
+            logger.info("🔑 Refazendo login da sessão do pool")
+            self.autenticar()
+
+    def encerrar(self):
+        pasta = self.manager.download_path
+        self.manager.encerrar()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+class PoolSessoesChrome:
+    """
+    Pool de Chrome já logados no MatrixNet, mantido pelo processo do app.
+
+    sessao(pasta) empresta uma sessão (criando se não houver livre, até
+    tamanho, ou mais dentro de ampliado), aponta os downloads para a pasta e a devolve ao fim. Sessões
+    que falharam, que não passam na verificação, cujo login não pôde ser
+    refeito ou que atingiram max_usos são fechadas e recriadas. Tudo é
+    encerrado na saída do processo.
+    """
+
+    def __init__(self, tamanho=TAMANHO_POOL_CHROME, headless=True, max_usos=MAX_USOS_SESSAO):
+        self.tamanho = tamanho
+        self.headless = headless
+        self.max_usos = max_usos
+        self._livres = []
+        self._total = 0
+        self._extras = 0
+        self._condicao = threading.Condition()
+        self._encerrado = False
+        atexit.register(self.encerrar)
+
+    def _limite(self):
+        return self.tamanho + self._extras
+
+    @contextmanager
+    def ampliado(self, tamanho):
+        """
+        Permite até tamanho sessões enquanto durar o bloco. No fim, as sessões
+        além do tamanho do pool são fechadas (as livres agora, as emprestadas
+        quando voltarem).
+        """
+        extras = max(0, tamanho - self.tamanho)
+        with self._condicao:
+            self._extras += extras
+            self._condicao.notify_all()
+        try:
+            yield self
+        finally:
+            with self._condicao:
+                self._extras -= extras
+                sobra = min(self._total - self._limite(), len(self._livres))
+                excedentes = [self._livres.pop() for _ in range(max(0, sobra))]
+                self._total -= len(excedentes)
+            for sessao in excedentes:
+                sessao.encerrar()
+
+    def aquecer(self):
+        """Cria as sessões que faltam em segundo plano, para a primeira execução não esperar"""
+        def criar():
+            while True:
+                with self._condicao:
+                    if self._encerrado or self._total >= self._limite():
+                        return
+                    self._total += 1
+                try:
+                    sessao = SessaoChrome(self.headless)
+                except Exception as e:
+                    logger.warning(f"⚠️ Falha ao aquecer sessão do pool: {e}")
+                    with self._condicao:
+                        self._total -= 1
+                        self._condicao.notify()
+                    return
+                self._devolver(sessao)
+
+        threading.Thread(target=criar, name="pool-chrome", daemon=True).start()
+
+    def _obter(self):
+        with self._condicao:
+            while True:
+                if self._encerrado:
+                    raise RuntimeError("Pool de sessões encerrado")
+                if self._livres:
+                    return self._livres.pop()
+                if self._total < self._limite():
+                    self._total += 1
+                    break
+                self._condicao.wait()
+        try:
+            return SessaoChrome(self.headless)
+        except Exception:
+            with self._condicao:
+                self._total -= 1
+                self._condicao.notify()
+            raise
+
+    def _devolver(self, sessao):
+        with self._condicao:
+            # Encerrado, ou sessão que sobrou de um ampliado que já terminou
+            fechar = self._encerrado or self._total > self._limite()
+            if fechar:
+                self._total -= 1
+            else:
+                self._livres.append(sessao)
+            self._condicao.notify()
+        if fechar:
+            sessao.encerrar()
+
+    def _descartar(self, sessao):
+        try:
+            sessao.encerrar()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao encerrar sessão do pool: {e}")
+        finally:
+            with self._condicao:
+                self._total -= 1
+                self._condicao.notify()
+
+    def _emprestar(self, pasta_download):
+        """
+        Sessão pronta para uso. Uma sessão que não passa na verificação ou cujo
+        novo login falha é descartada e trocada por outra, uma vez.
+        """
+        for tentativa in range(2):
+            sessao = self._obter()
+            try:
+                if not sessao.saudavel():
+                    raise WebDriverException("sessão fora da tela de pesquisa")
+                sessao.preparar()
+                definir_pasta_download(sessao.driver, pasta_download)
+                sessao.aba_principal = sessao.driver.current_window_handle
+                return sessao
+            except Exception as e:
+                self._descartar(sessao)
+                if tentativa:
+                    raise
+                logger.warning(f"⚠️ Sessão do pool descartada, abrindo outra: {e}")
+
+    def _limpar(self, sessao):
+        """Fecha as abas abertas durante o uso; False se a sessão não pode voltar ao pool"""
+        try:
+            if not verificar_driver_ativo(sessao.driver):
+                return False
+            fechar_abas_extras_rapido(sessao.driver, sessao.aba_principal)
+            return sessao.driver.current_window_handle == sessao.aba_principal
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao limpar sessão do pool: {e}")
+            return False
+
+    @contextmanager
+    def sessao(self, pasta_download):
+        sessao = self._emprestar(pasta_download)
+        falhou = False
+        try:
+            yield sessao.driver
+        except Exception:
+            falhou = True
+            raise
+        finally:
+            sessao.usos += 1
+            sessao.ultimo_uso = time.time()
+            if falhou or sessao.usos >= self.max_usos or not self._limpar(sessao):
+                self._descartar(sessao)
+            else:
+                self._devolver(sessao)
+
+    def encerrar(self):
+        with self._condicao:
+            self._encerrado = True
+            livres, self._livres = self._livres, []
+            self._condicao.notify_all()
+        for sessao in livres:
+            sessao.encerrar()
+
+
+_pools = {}
+_lock_pools = threading.Lock()
+
+
+def obter_pool(headless=True):
+    """Pool do processo para o modo (headless ou visual) pedido"""
+    with _lock_pools:
+        if headless not in _pools:
+            _pools[headless] = PoolSessoesChrome(headless=headless)
+        return _pools[headless]
+
+
+def log_streamlit(nivel, mensagem):
+    """Mensagem na página (st.info, st.warning...); só pode ser chamada pela thread do Streamlit"""
+    getattr(st, nivel)(mensagem)
+
+
+def pesquisar_paciente(driver, paciente):
+    """Pesquisa o paciente na tela de exames e retorna os botões "Laudo Completo" """
+    campo = WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, "textoDigitado")))
+    campo.clear()
+    campo.send_keys(paciente)
+    driver.find_element(By.XPATH, "//button[contains(., 'Pesquisar')]").click()
+    time.sleep(3)
+    return driver.find_elements(By.XPATH, "//button[contains(., 'Laudo Completo')]")
+
+
+def baixar_paciente(driver, paciente, monitor, log=None, sessao_http=None, indice=None):
+    """Pesquisa e baixa os laudos de um paciente; retorna quantos laudos ficaram na pasta"""
+    log = log or log_streamlit
+    log("write", f"🔍 Paciente: {paciente}")
+    aba_principal = driver.current_window_handle
+
+    botoes = pesquisar_paciente(driver, paciente)
+    if not botoes:
+        log("warning", f"⚠️ Paciente não encontrado: {paciente}")
+        return 0
+
+    downloads = processar_downloads_paciente(driver, botoes, paciente, monitor, aba_principal, log, sessao_http,
+                                             indice)
+    log("write", f"📥 {downloads}/{len(botoes)} downloads realizados para {paciente}")
+
+    fechar_abas_extras_rapido(driver, aba_principal)
+    return downloads
+
+
+def _baixar_por_http(driver, pendentes, total, paciente, monitor, sessao_http, log):
+    """
+    Baixa por HTTP os laudos pendentes [(posição, botão)] cujos botões têm URL
+    e os registra no manifesto; retorna {posição: caminho} dos baixados
+    """
+    urls = urls_dos_laudos(driver, [botao for _, botao in pendentes])
+    itens = [(i, url) for (i, _), url in zip(pendentes, urls) if url]
+    if not itens:
+        return {}
+
+    copiar_cookies(driver, sessao_http)
+    baixados = {}
+    for indice, (caminho, erro) in sorted(baixar_laudos(sessao_http, paciente, itens, monitor.pasta_download).items()):
+        if erro is None:
+            baixados[indice] = caminho
+            monitor.registrar(paciente, indice, caminho, "http")
+            log("success", f"⚡ Download {indice + 1}/{total} concluído ({os.path.basename(caminho)})")
+        else:
+            log("warning", f"⚠️ Download direto {indice + 1} falhou ({erro}); tentando pelo navegador")
+    return baixados
+
+
+def _reaproveitar_laudos(indice, paciente, chaves, monitor, log):
+    """Liga na pasta da execução os laudos já baixados em execuções anteriores; retorna as posições"""
+    reaproveitados = set()
+    for posicao, (copia, arquivo) in sorted(indice.conhecidos(paciente, chaves).items()):
+        try:
+            destino = vincular(copia, destino_unico(monitor.pasta_download, arquivo))
+        except OSError as e:
+            log("warning", f"⚠️ Não foi possível reaproveitar o laudo {posicao + 1} ({e}); baixando de novo")
+            continue
+        monitor.registrar(paciente, posicao, destino, "indice")
+        reaproveitados.add(posicao)
+    if reaproveitados:
+        log("info", f"♻️ {len(reaproveitados)}/{len(chaves)} laudos de {paciente} já tinham sido baixados")
+    return reaproveitados
+
+
+def _guardar_no_indice(indice, paciente, chaves, posicao, caminho, log):
+    if indice is None or not chaves or posicao >= len(chaves) or not chaves[posicao]:
+        return
+    try:
+        indice.registrar(paciente, chaves[posicao], caminho)
+    except Exception as e:
+        log("warning", f"⚠️ Laudo {posicao + 1} baixado, mas não entrou no índice: {e}")
+
+
+def processar_downloads_paciente(driver, botoes, paciente, monitor, aba_principal, log=None, sessao_http=None,
+                                 indice=None):
+    """
+    Processa downloads de um paciente de forma otimizada
+
+    Com indice (IndiceLaudos), os laudos já baixados em execuções anteriores
+    são ligados na pasta sem clique nem download, e os novos entram no índice.
+    Com sessao_http, os laudos cujos botões apontam para uma URL são
+    baixados direto, em paralelo; só o resto é clicado no navegador.
+    """
+    log = log or log_streamlit
     downloads_sucesso = 0
-    
-    for idx_botao, botao in enumerate(botoes):
+    pendentes = list(enumerate(botoes))
+
+    chaves = None
+    if indice is not None:
+        try:
+            chaves = chaves_dos_laudos(driver, botoes)
+            reaproveitados = _reaproveitar_laudos(indice, paciente, chaves, monitor, log)
+        except Exception as e:
+            log("warning", f"⚠️ Índice de laudos indisponível ({e}); baixando todos")
+            reaproveitados = set()
+        downloads_sucesso += len(reaproveitados)
+        pendentes = [(i, botao) for i, botao in pendentes if i not in reaproveitados]
+
+    if sessao_http is not None and pendentes:
+        try:
+            baixados = _baixar_por_http(driver, pendentes, len(botoes), paciente, monitor, sessao_http, log)
+        except Exception as e:
+            log("warning", f"⚠️ Download direto indisponível ({e}); usando o navegador")
+            baixados = {}
+        for posicao, caminho in baixados.items():
+            _guardar_no_indice(indice, paciente, chaves, posicao, caminho, log)
+        downloads_sucesso += len(baixados)
+        pendentes = [(i, botao) for i, botao in pendentes if i not in baixados]
+
+    for idx_botao, botao in pendentes:
         try:
             if not verificar_driver_ativo(driver):
-                st.error("❌ Driver perdeu conexão durante download")
+                log("error", "❌ Driver perdeu conexão durante download")
                 break
 
-            st.info(f"📥 Download {idx_botao + 1}/{len(botoes)} - {paciente}")
+            log("info", f"📥 Download {idx_botao + 1}/{len(botoes)} - {paciente}")
             
             # Reset do monitor para este download
             monitor.reset()
@@ -490,30 +963,37 @@ def processar_downloads_paciente(driver, botoes, paciente, monitor, aba_principa
                     time.sleep(1)
             
             if not success:
-                st.warning(f"⚠️ Falha ao clicar no download {idx_botao + 1}")
+                log("warning", f"⚠️ Falha ao clicar no download {idx_botao + 1}")
                 continue
             
-            # Aguarda download
-            if monitor.aguardar_download(timeout=15):
+            # Aguarda o arquivo sair do .crdownload; ele já fica registrado no manifesto
+            caminho = monitor.aguardar_download(timeout=15, paciente=paciente, indice=idx_botao)
+            if caminho:
                 downloads_sucesso += 1
-                st.success(f"✅ Download {idx_botao + 1} concluído")
+                _guardar_no_indice(indice, paciente, chaves, idx_botao, caminho, log)
+                log("success", f"✅ Download {idx_botao + 1} concluído ({os.path.basename(caminho)})")
             else:
-                st.warning(f"⚠️ Download {idx_botao + 1} pode ter falhado (timeout)")
-            
-            # Pausa entre downloads
-            time.sleep(1)
+                log("warning", f"⚠️ Download {idx_botao + 1} pode ter falhado (timeout)")
             
         except Exception as e:
-            st.warning(f"Erro no download {idx_botao + 1}: {str(e)}")
+            log("warning", f"Erro no download {idx_botao + 1}: {str(e)}")
             continue
     
     return downloads_sucesso
 
 
-def executar_downloads_automatico(nomes_pacientes, modo_headless=True):
+def executar_downloads_automatico(nomes_pacientes, modo_headless=True, usar_pool=True, usar_http=True,
+                                  incremental=True):
     """
     Função para executar downloads de forma automática
+
+    Com usar_pool, usa uma sessão já logada do pool do processo em vez de
+    abrir e fechar um Chrome a cada execução. Com usar_http, os laudos com
+    URL própria são baixados direto com os cookies do navegador (a pesquisa
+    continua no navegador). Com incremental, laudos já baixados em execuções
+    anteriores vêm do índice local em vez de serem baixados de novo.
     """
+    indice = INDICE_LAUDOS if incremental else None
     
     # Configuração de pastas
     base_folder = os.path.join(os.path.dirname(__file__), "pdfs_abc")
@@ -522,53 +1002,37 @@ def executar_downloads_automatico(nomes_pacientes, modo_headless=True):
     os.makedirs(output_folder, exist_ok=True)
 
     try:
-        st.info("🚀 Iniciando navegador otimizado para GCP...")
-        
-        with ChromeManager(download_path=output_folder, headless=modo_headless) as driver:
+        if usar_pool:
+            st.info("♻️ Obtendo sessão do pool de navegadores...")
+            contexto = obter_pool(modo_headless).sessao(output_folder)
+        else:
+            st.info("🚀 Iniciando navegador otimizado para GCP...")
+            contexto = ChromeManager(download_path=output_folder, headless=modo_headless)
+        sessao_do_pool = usar_pool
+
+        with contexto as driver, DownloadMonitor(output_folder) as monitor:
             st.info("🤖 Modo headless ativado" if modo_headless else "🖥️ Modo visual ativado")
-            
-            # Inicializar monitor de downloads
-            monitor = DownloadMonitor(output_folder)
-
-            st.info("🔗 Acessando site...")
-            driver.get("http://laboratorio.fmabc.br/matrixnet/wfrmBlank.aspx")
-            st.success("🌐 Site carregado")
-
-            # Login
-            st.info("🔑 Fazendo login...")
-            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.NAME, "userLogin")))
-            driver.find_element(By.NAME, "userLogin").send_keys("HOAN")
-            driver.find_element(By.NAME, "userPassword").send_keys("5438")
-            driver.find_element(By.ID, "btnEntrar").click()
-            
-            time.sleep(3)
-            st.success("✅ Login realizado")
 
-            if not verificar_driver_ativo(driver):
-                st.error("❌ Driver perdeu conexão após login")
-                return None
+            if sessao_do_pool:
+                st.success("♻️ Sessão já autenticada reaproveitada do pool")
+            else:
+                st.info("🔑 Fazendo login...")
+                fazer_login(driver)
+                st.success("✅ Login realizado")
 
-            st.info("🎯 Navegando para exames...")
-            
-            # Navegação com timeouts aumentados
-            try:
-                element = WebDriverWait(driver, 15).until(
-                    EC.element_to_be_clickable((By.ID, "97-0B-E6-B7-F9-16-53-7C-C6-2C-E0-37-D0-67-F7-9E"))
-                )
-                driver.execute_script("arguments[0].click();", element)
-                time.sleep(2)
-                
-                second_element = WebDriverWait(driver, 15).until(
-                    EC.element_to_be_clickable((By.ID, "A1-2C-C6-AF-7F-6B-2B-3E-D5-00-73-F2-37-A1-D6-25"))
-                )
-                driver.execute_script("arguments[0].click();", second_element)
-                time.sleep(2)
-                
-                st.success("✅ Navegação concluída")
-                
-            except Exception as e:
-                st.error(f"❌ Erro na navegação: {e}")
-                return None
+                if not verificar_driver_ativo(driver):
+                    st.error("❌ Driver perdeu conexão após login")
+                    return None
+
+                st.info("🎯 Navegando para exames...")
+                try:
+                    navegar_para_exames(driver)
+                    st.success("✅ Navegação concluída")
+                except Exception as e:
+                    st.error(f"❌ Erro na navegação: {e}")
+                    return None
+
+            sessao_http = criar_sessao_http(driver) if usar_http else None
 
             # Processar pacientes
             progresso = st.progress(0)
@@ -582,27 +1046,7 @@ def executar_downloads_automatico(nomes_pacientes, modo_headless=True):
                         st.error(f"❌ Driver perdeu conexão no paciente: {paciente}")
                         break
 
-                    st.write(f"🔍 Paciente: {paciente}")
-                    aba_principal = driver.current_window_handle
-
-                    # Busca
-                    campo = WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, "textoDigitado")))
-                    campo.clear()
-                    campo.send_keys(paciente)
-                    driver.find_element(By.XPATH, "//button[contains(., 'Pesquisar')]").click()
-                    time.sleep(3)
-
-                    botoes = driver.find_elements(By.XPATH, "//button[contains(., 'Laudo Completo')]")
-                    if not botoes:
-                        st.warning(f"⚠️ Paciente não encontrado: {paciente}")
-                        continue
-
-                    # Processar downloads do paciente
-                    downloads = processar_downloads_paciente(driver, botoes, paciente, monitor, aba_principal)
-                    st.write(f"📥 {downloads}/{len(botoes)} downloads realizados para {paciente}")
-
-                    # Limpeza de abas
-                    fechar_abas_extras_rapido(driver, aba_principal)
+                    baixar_paciente(driver, paciente, monitor, sessao_http=sessao_http, indice=indice)
 
                 except Exception as e:
                     st.warning(f"Erro no paciente {paciente}: {str(e)}")
@@ -623,21 +1067,142 @@ def executar_downloads_automatico(nomes_pacientes, modo_headless=True):
         return None
 
 
-def executar_robo_fmabc(nomes_pacientes=None):
+def juntar_pastas(pastas, destino):
+    """
+    Move os arquivos baixados de cada pasta para o destino, renomeando em caso
+    de nome repetido, e leva junto as linhas dos manifestos com os nomes novos
+    """
+    movidos = 0
+    for pasta in pastas:
+        if not os.path.isdir(pasta):
+            continue
+        renomeados = {}
+        for nome in sorted(os.listdir(pasta)):
+            origem = os.path.join(pasta, nome)
+            if not os.path.isfile(origem) or nome == NOME_MANIFESTO or nome.endswith(('.crdownload', '.tmp', '.part')):
+                continue
+            final = destino_unico(destino, nome)
+            shutil.move(origem, final)
+            renomeados[nome] = os.path.basename(final)
+            movidos += 1
+        mover_registros(pasta, destino, renomeados)
+        shutil.rmtree(pasta, ignore_errors=True)
+    return movidos
+
+
+def executar_downloads_paralelo(nomes_pacientes, sessoes=SESSOES_PARALELAS_PADRAO, modo_headless=True,
+                                usar_http=True, incremental=True):
+    """
+    Divide os pacientes entre várias sessões do pool, uma thread por sessão,
+    cada uma baixando numa pasta própria. No fim os arquivos são juntados
+    numa única pasta de saída, como a execução sequencial produz.
+    O índice de laudos (incremental) é compartilhado pelas sessões.
+
+    As threads não chamam o Streamlit: mensagens e progresso de cada sessão
+    são passados à thread principal, que desenha uma barra por sessão.
+    """
+    base_folder = os.path.join(os.path.dirname(__file__), "pdfs_abc")
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    output_folder = os.path.join(base_folder, timestamp)
+    os.makedirs(output_folder, exist_ok=True)
+
+    indice = INDICE_LAUDOS if incremental else None
+    n = max(1, min(sessoes, len(nomes_pacientes)))
+    fatias = [nomes_pacientes[i::n] for i in range(n)]
+    pastas = [os.path.join(output_folder, f".sessao_{k + 1}") for k in range(n)]
+    estado = [{"feitos": 0, "total": len(fatia), "paciente": "", "pdfs": 0} for fatia in fatias]
+    mensagens = queue.Queue()
+
+    pool = obter_pool(modo_headless)
+
+    def trabalhar(k):
+        def log(nivel, mensagem):
+            mensagens.put((k, nivel, mensagem))
+
+        with pool.sessao(pastas[k]) as driver, DownloadMonitor(pastas[k]) as monitor:
+            sessao_http = criar_sessao_http(driver) if usar_http else None
+            for paciente in fatias[k]:
+                estado[k]["paciente"] = paciente
+                try:
+                    if not verificar_driver_ativo(driver):
+                        log("error", f"❌ Driver perdeu conexão no paciente: {paciente}")
+                        break
+                    baixar_paciente(driver, paciente, monitor, log, sessao_http, indice)
+                except Exception as e:
+                    log("warning", f"Erro no paciente {paciente}: {str(e)}")
+                finally:
+                    estado[k]["feitos"] += 1
+                    estado[k]["pdfs"] = contar_pdfs_pasta(pastas[k])
+
+    st.info(f"📋 Processando {len(nomes_pacientes)} pacientes em {n} sessões...")
+    barras = [st.progress(0.0, text=f"Sessão {k + 1}: aguardando navegador") for k in range(n)]
+    registro = st.expander("📜 Mensagens das sessões", expanded=False)
+
+    with pool.ampliado(n), ThreadPoolExecutor(max_workers=n, thread_name_prefix="download") as executor:
+        futuros = [executor.submit(trabalhar, k) for k in range(n)]
+        while True:
+            terminou = all(f.done() for f in futuros)
+            while not mensagens.empty():
+                k, nivel, mensagem = mensagens.get()
+                with registro:
+                    log_streamlit(nivel, f"[Sessão {k + 1}] {mensagem}")
+            for k, barra in enumerate(barras):
+                e = estado[k]
+                barra.progress(
+                    e["feitos"] / e["total"] if e["total"] else 1.0,
+                    text=f"Sessão {k + 1}: {e['feitos']}/{e['total']} pacientes, {e['pdfs']} PDFs"
+                         + (f" — {e['paciente']}" if e["paciente"] and e["feitos"] < e["total"] else ""),
+                )
+            if terminou:
+                break
+            time.sleep(0.5)
+
+        for k, futuro in enumerate(futuros):
+            try:
+                futuro.result()
+            except Exception as e:
+                st.error(f"❌ Sessão {k + 1} falhou: {e}")
+                logger.error(f"Erro na sessão {k + 1}: {e}", exc_info=True)
+
+    juntar_pastas(pastas, output_folder)
+    total_pdfs = contar_pdfs_pasta(output_folder)
+    st.success(f"✅ Concluído! {total_pdfs} PDFs baixados em: {output_folder}")
+    return output_folder
+
+
+def executar_robo_fmabc(nomes_pacientes=None, sessoes=1):
     """
     Função principal que pode ser chamada tanto pela interface quanto programaticamente
     """
     
     # Se recebeu lista de nomes, executa automaticamente
     if nomes_pacientes is not None:
+        if sessoes > 1:
+            return executar_downloads_paralelo(nomes_pacientes, sessoes, modo_headless=True)
         return executar_downloads_automatico(nomes_pacientes, modo_headless=True)
     
     # Caso contrário, mostra interface do Streamlit
     st.subheader("⬇️ Download de exames")
     
     modo_headless = st.checkbox("🤖 Modo headless (recomendado)", value=True)
+    usar_pool = st.checkbox("♻️ Reaproveitar navegador já logado", value=True)
+    sessoes = st.number_input(
+        "🧵 Sessões em paralelo (cada uma é um navegador logado)",
+        min_value=1, max_value=MAX_SESSOES_PARALELAS, value=1,
+        disabled=not usar_pool,
+    )
+    usar_http = st.checkbox("⚡ Baixar laudos direto (sem clicar) quando o botão tiver link", value=True)
+    incremental = st.checkbox(
+        "🗂️ Reaproveitar laudos já baixados em execuções anteriores",
+        value=True,
+        help="Laudos de hoje e de ontem são sempre baixados de novo, pois podem ter resultados liberados depois.",
+    )
     entrada_pacientes = st.text_area("Cole aqui os nomes dos pacientes (um por linha):")
 
+    if usar_pool:
+        # Abre e loga o navegador enquanto os nomes são digitados
+        obter_pool(modo_headless).aquecer()
+
     if st.button("🚀 Executar Nephroghost"):
         nomes = [n.strip() for n in entrada_pacientes.strip().splitlines() if n.strip()]
         
@@ -645,7 +1210,12 @@ def executar_robo_fmabc(nomes_pacientes=None):
             st.error("❌ Por favor, insira pelo menos um nome de paciente.")
             return
         
-        resultado = executar_downloads_automatico(nomes, modo_headless)
+        if usar_pool and sessoes > 1:
+            resultado = executar_downloads_paralelo(nomes, int(sessoes), modo_headless, usar_http=usar_http,
+                                                    incremental=incremental)
+        else:
+            resultado = executar_downloads_automatico(nomes, modo_headless, usar_pool=usar_pool, usar_http=usar_http,
+                                                      incremental=incremental)
         
         if resultado:
             st.success(f"✅ Downloads concluídos com sucesso! Pasta: {resultado}")
@@ -0,0 +1,114 @@
+# verificar_scanner.py - Confere o ScannerAnalitos (texto inteiro e por páginas) contra re.search dos padrões de definir_padroes
+
+import argparse
+import random
+import re
+import sys
+
+from extrator import (
+    FLAGS_PADROES, _converter_valores, definir_padroes, extrair_valores, extrair_valores_paginas,
+)
+
+# Laudos de exemplo (trechos no formato do MatrixNet) com os valores esperados.
+# Se um padrão mudar de propósito, atualize os valores aqui junto.
+CASOS_FIXOS = [
+    (
+        "MARIA DA SILVA\nNome: MARIA DA SILVA\nAmostra recebida em: 12/10/2026 as 07h 15min\n"
+        "CREATININA\nResultado: 1,32 mg/dL\nUREIA\nResultado: 48 mg/dL\n"
+        "SÓDIO\nResultado: 138 mEq/L\nPOTÁSSIO\nResultado: 4,6 mEq/L\n",
+        {"Creatinina": 1.32, "Ureia": 48.0, "Sódio": 138.0, "Potássio": 4.6},
+    ),
+    (
+        "BICARBONATO\n  22,5 mmol/L\nMAGNÉSIO\nMétodo: colorimétrico\nRESULTADO: 1,9 mg/dL\n"
+        "CÁLCIO IÔNICO\nRESULTADO: 1,12 mmol/L\nFÓSFORO\n 3,8 mg/dL\n",
+        {"Bicarbonato": 22.5, "Magnésio": 1.9, "Cálcio": 1.12, "Cálcio Total": False, "Fósforo": 3.8},
+    ),
+    (
+        "HEMOGRAMA\nHEMOGLOBINA: 9,8 g/dL\nPLAQUETAS ..........: 250.000 /mm3\n"
+        "PROTEÍNA C REATIVA 12,4 mg/L\nCÁLCIO\nRESULTADO:\n 8,9 mg/dL\n",
+        {"Hemoglobina": 9.8, "Plaquetas": 250000.0, "Proteína C Reativa": 12.4, "Cálcio": 8.9,
+         "Cálcio Total": True},
+    ),
+    (
+        "Página 1 de 2\nCREATININA\n",
+        {},
+    ),
+]
+
+FRAGMENTOS = [
+    "CREATININA", "Creatinina ", "UREIA", "Uréia", "BICARBONATO", "SÓDIO", "sodio", "POTASSIO", "MAGNÉSIO",
+    "CÁLCIO", "CALCIO IONICO", "Cálcio Iônico", "FÓSFORO", "HEMOGLOBINA", "PLAQUETAS", "PROTEÍNA C REATIVA",
+    "RESULTADO", "Resultado: ", ":", " ", "\n", "\n", "12,5", "3.4", "250.000", "0,8", "abc", "texto qualquer ",
+    "ı", "ſ", "x",
+]
+
+
+def referencia(texto, padroes):
+    """Valores como o extrator original dava: um re.search por padrão sobre o texto inteiro"""
+    brutos = {}
+    for exame, padrao in padroes.items():
+        match = re.search(padrao, texto, FLAGS_PADROES)
+        if match:
+            brutos[exame] = match.group(1)
+    return _converter_valores(brutos, padroes)
+
+
+def _preenchidos(valores):
+    return {exame: valor for exame, valor in valores.items() if valor is not None}
+
+
+def comparar(paginas, padroes):
+    """Lista de divergências (descrição) entre referência, scanner e leitura por páginas"""
+    texto = "\n".join(paginas)
+    esperado = referencia(texto, padroes)
+    divergencias = []
+    inteiro = extrair_valores(texto, padroes)
+    if inteiro != esperado:
+        divergencias.append(f"texto inteiro: {_preenchidos(inteiro)} != {_preenchidos(esperado)}")
+    # A leitura por páginas pode parar antes do fim; o que achou tem que ser o mesmo
+    por_paginas, _ = extrair_valores_paginas(iter(paginas), padroes)
+    if por_paginas != esperado:
+        divergencias.append(f"por páginas: {_preenchidos(por_paginas)} != {_preenchidos(esperado)}")
+    return divergencias
+
+
+def gerar_paginas(aleatorio):
+    return [
+        "".join(aleatorio.choice(FRAGMENTOS) for _ in range(aleatorio.randint(0, 30)))
+        for _ in range(aleatorio.randint(1, 6))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confere o scanner de analitos contra os padrões originais")
+    parser.add_argument("--casos", type=int, default=20000, help="textos aleatórios a comparar")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    padroes = definir_padroes()
+    erros = 0
+
+    for i, (texto, esperado) in enumerate(CASOS_FIXOS):
+        obtido = _preenchidos(extrair_valores(texto, padroes))
+        if obtido != esperado:
+            erros += 1
+            print(f"❌ Caso fixo {i + 1}: {obtido} != {esperado}")
+        # Cada linha como uma página: exercita as emendas entre páginas
+        for divergencia in comparar(texto.split("\n"), padroes):
+            erros += 1
+            print(f"❌ Caso fixo {i + 1}, {divergencia}")
+
+    aleatorio = random.Random(args.semente)
+    for i in range(args.casos):
+        paginas = gerar_paginas(aleatorio)
+        for divergencia in comparar(paginas, padroes):
+            erros += 1
+            if erros <= 20:
+                print(f"❌ Caso aleatório {i} {paginas!r}, {divergencia}")
+
+    print(f"{len(CASOS_FIXOS)} casos fixos, {args.casos} aleatórios: {erros} divergência(s)")
+    sys.exit(1 if erros else 0)
+
+
+if __name__ == "__main__":
+    main()
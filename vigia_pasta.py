@@ -0,0 +1,117 @@
+# vigia_pasta.py - Aviso de arquivos concluídos numa pasta (inotify via ctypes no Linux, varredura nos demais)
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: int wd; uint32 mask, cookie, len; char name[len]
+_CABECALHO_EVENTO = struct.Struct("iIII")
+EXTENSOES_TEMPORARIAS = (".crdownload", ".tmp", ".part")
+INTERVALO_VARREDURA = 0.25
+
+_libc = None
+
+
+def _carregar_libc():
+    global _libc
+    if _libc is None:
+        nome = ctypes.util.find_library("c")
+        _libc = ctypes.CDLL(nome or "libc.so.6", use_errno=True)
+    return _libc
+
+
+def arquivo_final(nome):
+    """True para arquivos que não são temporários de download nem ocultos"""
+    return bool(nome) and not nome.startswith(".") and not nome.endswith(EXTENSOES_TEMPORARIAS)
+
+
+class VigiaPasta:
+    """
+    Entrega os nomes de arquivos que terminaram de ser gravados na pasta.
+
+    No Linux usa inotify: o Chrome grava "x.pdf.crdownload" e renomeia para
+    "x.pdf" ao terminar (IN_MOVED_TO), e o download HTTP faz o mesmo com
+    ".part" — o aviso chega no instante do rename. Sem inotify, compara
+    listagens da pasta a cada INTERVALO_VARREDURA.
+    """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+        self._fd = None
+        self._vistos = set()
+        try:
+            libc = _carregar_libc()
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1")
+            if libc.inotify_add_watch(fd, os.fsencode(pasta), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                erro = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(erro, "inotify_add_watch")
+            self._fd = fd
+        except (OSError, AttributeError):
+            self._vistos = set(os.listdir(pasta))
+
+    @property
+    def usa_inotify(self):
+        return self._fd is not None
+
+    def _ler_eventos(self, timeout):
+        prontos, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if not prontos:
+            return []
+        try:
+            dados = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        nomes, posicao = [], 0
+        while posicao + _CABECALHO_EVENTO.size <= len(dados):
+            _, _, _, tamanho = _CABECALHO_EVENTO.unpack_from(dados, posicao)
+            posicao += _CABECALHO_EVENTO.size
+            nome = dados[posicao:posicao + tamanho].rstrip(b"\0")
+            posicao += tamanho
+            nomes.append(os.fsdecode(nome))
+        return nomes
+
+    def _varrer(self, timeout):
+        limite = time.monotonic() + timeout
+        while True:
+            atuais = set(os.listdir(self.pasta))
+            novos = atuais - self._vistos
+            # Só conta o que já saiu do temporário; o resto fica para a próxima volta
+            prontos = [n for n in novos if arquivo_final(n)]
+            self._vistos |= set(prontos)
+            if prontos or time.monotonic() >= limite:
+                return sorted(prontos)
+            time.sleep(min(INTERVALO_VARREDURA, max(0.0, limite - time.monotonic())))
+
+    def aguardar(self, timeout):
+        """Lista de arquivos concluídos (nomes finais) até timeout segundos; vazia se nada chegou"""
+        limite = time.monotonic() + timeout
+        while True:
+            restante = limite - time.monotonic()
+            if self._fd is None:
+                return self._varrer(restante)
+            prontos = [n for n in dict.fromkeys(self._ler_eventos(restante)) if arquivo_final(n)]
+            if prontos or restante <= 0:
+                return prontos
+
+    def fechar(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fechar()